@@ -0,0 +1,142 @@
+# File: analysis_quality.py
+"""AI javobi sifatini baholash (Streamlit'dan mustaqil).
+
+app.py dagi qayta urinish mantiqi va benchmarks/ skriptlari shu bahodan
+foydalanadi - app.py ni import qilish UI ni ishga tushirib yuborgani uchun
+alohida modulda.
+"""
+
+
+def assess_quality(response_text: str) -> dict:
+    """Javob sifatini baholash - KENGAYTIRILGAN VERSIYA"""
+    if not response_text:
+        return {"score": 0, "reason": "Bo'sh javob", "retry": True, "details": {}}
+    
+    text = response_text.lower()
+    
+    # Skor hisoblash
+    score = 100
+    reasons = []
+    details = {}
+    
+    # 1. Noaniqlik belgilari tekshirish (ANIQROQ CHEGARALAR)
+    unclear_count = text.count("[?]") + text.count("unclear") + text.count("noaniq") + text.count("[...]")
+    details['unclear_marks'] = unclear_count
+    
+    if unclear_count > 20:
+        score -= 40
+        reasons.append(f"{unclear_count} noaniq belgi (juda ko'p - rasmni yaxshilang)")
+    elif unclear_count > 12:
+        score -= 25
+        reasons.append(f"{unclear_count} noaniq belgi (ko'p)")
+    elif unclear_count > 6:
+        score -= 12
+        reasons.append(f"{unclear_count} noaniq belgi (o'rtacha)")
+    elif unclear_count > 0:
+        score -= 3
+        reasons.append(f"{unclear_count} noaniq belgi (oz)")
+    
+    # 2. Javob uzunligi tekshirish (ANIQROQ)
+    word_count = len(response_text.split())
+    details['word_count'] = word_count
+    
+    if word_count < 30:
+        score -= 40
+        reasons.append("Juda qisqa javob (kam ma'lumot)")
+    elif word_count < 80:
+        score -= 20
+        reasons.append("Qisqa javob (to'liqroq bo'lishi kerak)")
+    elif word_count < 150:
+        score -= 5
+        reasons.append("Qisqaroq javob")
+    else:
+        score += 5  # Bonus batafsil javob uchun
+    
+    # 3. MAJBURIY bo'limlar tekshirish
+    required_sections = [
+        ("transliteratsiya", "Transliteratsiya bo'limi yo'q", 20),
+        ("tarjima", "Tarjima bo'limi yo'q", 20),
+        ("leksik", "Leksik tahlil yo'q", 15),
+        ("identifikatsiya", "Manba identifikatsiyasi yo'q", 10),
+        ("izoh", "Izohlar bo'limi yo'q", 10),
+    ]
+    
+    missing_sections = []
+    for keyword, error_msg, penalty in required_sections:
+        if keyword not in text:
+            score -= penalty
+            reasons.append(error_msg)
+            missing_sections.append(keyword)
+    details['missing_sections'] = missing_sections
+    
+    # 4. Jadval formati tekshirish (ANIQROQ)
+    table_rows = response_text.count("|")
+    details['table_rows'] = table_rows
+    
+    if table_rows < 3:
+        score -= 15
+        reasons.append("Jadval yo'q yoki to'liq emas")
+    elif table_rows < 8:
+        score -= 5
+        reasons.append("Jadval qisqa (kamida 5-10 qator bo'lishi kerak)")
+    
+    # 5. Xato xabarlari tekshirish
+    error_keywords = ["error", "xato", "imkonsiz", "o'qib bo'lmaydi", "ko'rinmaydi", "butunlay", "yo'q"]
+    found_errors = []
+    for kw in error_keywords:
+        if kw in text and text.count(kw) > 2:  # 2 martadan ko'p
+            found_errors.append(kw)
+    
+    if found_errors:
+        score -= 15
+        reasons.append(f"Ko'p xato belgilari: {', '.join(found_errors[:3])}")
+    details['error_keywords'] = found_errors
+    
+    # 6. Aniqlik bahosi tekshirish (YANGI: sonlarni tekshirish)
+    percent_count = response_text.count("%")
+    details['percent_marks'] = percent_count
+    
+    if percent_count == 0:
+        score -= 10
+        reasons.append("Aniqlik foizlari yo'q")
+    elif percent_count < 3:
+        score -= 5
+        reasons.append("Kamida 3 ta aniqlik foizi bo'lishi kerak")
+    
+    # 7. YANGI: Bo'lim sarlavhalari mavjudligi
+    section_headers = response_text.count("##")
+    details['section_headers'] = section_headers
+    
+    if section_headers < 5:
+        score -= 10
+        reasons.append(f"Faqat {section_headers} ta bo'lim sarlavhasi (kamida 5-7 ta kerak)")
+    
+    # 8. YANGI: Javob strukturasini tekshirish
+    has_good_structure = ("##" in response_text and 
+                         response_text.count("\n\n") > 5 and
+                         len(response_text.split("\n")) > 20)
+    if not has_good_structure:
+        score -= 8
+        reasons.append("Yomon formatlangan javob")
+    details['has_structure'] = has_good_structure
+    
+    # Final skorni hisoblash
+    final_score = max(0, min(100, score))
+    
+    # Sifat darajasini aniqlash
+    if final_score >= 85:
+        quality_level = "A'lo"
+    elif final_score >= 70:
+        quality_level = "Yaxshi"
+    elif final_score >= 55:
+        quality_level = "Qoniqarli"
+    else:
+        quality_level = "Past"
+    
+    return {
+        "score": final_score,
+        "level": quality_level,
+        "reason": ", ".join(reasons) if reasons else "Mukammal sifat",
+        "retry": final_score < 55,  # 55 dan past bo'lsa qayta urinish
+        "details": details
+    }
@@ -0,0 +1,180 @@
+# File: api_retry.py
+"""Gemini chaqiruvlari uchun xatolarni tasniflab qayta urinish (Streamlit'dan mustaqil).
+
+Vaqtinchalik xatolar (429, 5xx, timeout, tarmoq) eksponensial backoff va
+jitter bilan, umumiy muddat (deadline) ichida qayta yuboriladi; server
+ko'rsatgan "retry after" vaqti hurmat qilinadi. Qayta yuborish foyda
+bermaydigan xatolar (noto'g'ri so'rov, xavfsizlik bloki) hech qachon
+takrorlanmaydi. google.api_core ni import qilmaslik uchun tasnif
+istisno nomlari va HTTP kodlari bo'yicha qilinadi.
+"""
+
+import random
+import re
+import time
+from typing import NamedTuple
+
+RATE_LIMIT = "rate_limit"
+SERVER_ERROR = "server_error"
+TIMEOUT = "timeout"
+SAFETY_BLOCK = "safety_block"
+INVALID_REQUEST = "invalid_request"
+UNKNOWN = "unknown"
+
+RETRYABLE = frozenset({RATE_LIMIT, SERVER_ERROR, TIMEOUT})
+
+ERROR_LABELS = {
+    RATE_LIMIT: "API limiti (429)",
+    SERVER_ERROR: "Server xatosi (5xx)",
+    TIMEOUT: "Vaqt tugadi / tarmoq",
+    SAFETY_BLOCK: "Xavfsizlik filtri blokladi",
+    INVALID_REQUEST: "Noto'g'ri so'rov",
+    UNKNOWN: "Noma'lum xato",
+}
+
+_NAME_KINDS = {
+    "ResourceExhausted": RATE_LIMIT,
+    "TooManyRequests": RATE_LIMIT,
+    "InternalServerError": SERVER_ERROR,
+    "ServiceUnavailable": SERVER_ERROR,
+    "BadGateway": SERVER_ERROR,
+    "Aborted": SERVER_ERROR,
+    "Unknown": SERVER_ERROR,
+    "DeadlineExceeded": TIMEOUT,
+    "GatewayTimeout": TIMEOUT,
+    "RetryError": TIMEOUT,
+    "BlockedPromptException": SAFETY_BLOCK,
+    "StopCandidateException": SAFETY_BLOCK,
+    "InvalidArgument": INVALID_REQUEST,
+    "BadRequest": INVALID_REQUEST,
+    "FailedPrecondition": INVALID_REQUEST,
+    "PermissionDenied": INVALID_REQUEST,
+    "Unauthenticated": INVALID_REQUEST,
+    "Unauthorized": INVALID_REQUEST,
+    "Forbidden": INVALID_REQUEST,
+    "NotFound": INVALID_REQUEST,
+}
+_RETRY_IN = re.compile(r"retry in\s+([0-9.]+)\s*(ms|s)", re.IGNORECASE)
+
+
+class RetryPolicy(NamedTuple):
+    max_attempts: int = 4
+    base_delay: float = 1.0  # birinchi kutish (s); har urinishda 2 barobar
+    max_delay: float = 30.0
+    deadline: float = 180.0  # barcha urinishlar uchun umumiy muddat (s)
+
+
+class AICallError(Exception):
+    """Tasniflangan API xatosi; kind - yuqoridagi konstantalardan biri"""
+
+    def __init__(self, kind: str, cause: BaseException = None, attempts: int = 1):
+        super().__init__(f"{ERROR_LABELS.get(kind, kind)}: {cause}" if cause else ERROR_LABELS.get(kind, kind))
+        self.kind = kind
+        self.cause = cause
+        self.attempts = attempts
+
+    @property
+    def retryable(self) -> bool:
+        return self.kind in RETRYABLE
+
+
+def classify_error(exc: BaseException) -> str:
+    if isinstance(exc, AICallError):
+        return exc.kind
+    for cls in type(exc).__mro__:
+        kind = _NAME_KINDS.get(cls.__name__)
+        if kind:
+            return kind
+    code = getattr(exc, "code", None)
+    code = code() if callable(code) else code
+    code = getattr(code, "value", code)  # grpc.StatusCode -> (raqam, nom)
+    if isinstance(code, tuple):
+        code = code[0]
+    if isinstance(code, int):
+        if code == 429:
+            return RATE_LIMIT
+        if code in (408, 504):
+            return TIMEOUT
+        if code >= 500:
+            return SERVER_ERROR
+        if 400 <= code < 500:
+            return INVALID_REQUEST
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return TIMEOUT
+    return UNKNOWN
+
+
+def retry_after_hint(exc: BaseException):
+    """Server ko'rsatgan kutish vaqti (s) yoki None: Retry-After sarlavhasi,
+    RetryInfo tafsiloti yoki "Please retry in 12.3s" matni"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("Retry-After") if hasattr(headers, "get") else None
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    for detail in getattr(exc, "details", None) or ():
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return getattr(delay, "seconds", 0) + getattr(delay, "nanos", 0) / 1e9
+    match = _RETRY_IN.search(str(exc))
+    if match:
+        amount = float(match.group(1))
+        return amount / 1000 if match.group(2).lower() == "ms" else amount
+    return None
+
+
+def backoff_delay(attempt: int, policy: RetryPolicy) -> float:
+    """To'liq jitter: [0, min(max_delay, base * 2^attempt)] oralig'ida tasodifiy"""
+    return random.uniform(0, min(policy.max_delay, policy.base_delay * (2 ** attempt)))
+
+
+def _final_error(kind: str, exc: BaseException, attempts: int) -> AICallError:
+    """Yakuniy AICallError; fn ichida ko'tarilgan AICallError qayta o'ralmaydi"""
+    if isinstance(exc, AICallError):
+        exc.attempts = attempts
+        return exc
+    error = AICallError(kind, exc, attempts)
+    error.__cause__ = exc
+    return error
+
+
+def call_with_retries(fn, policy: RetryPolicy = RetryPolicy(), sleep=time.sleep, on_retry=None):
+    """fn(timeout) ni tasniflangan qayta urinishlar bilan chaqirish.
+
+    timeout - umumiy muddatdan qolgan vaqt (s): fn uni so'rov timeout'i sifatida
+    berishi kerak, aks holda osilib qolgan chaqiruv muddatni buzadi.
+    Qayta urinib bo'lmaydigan xato, urinishlar tugashi yoki muddat o'tishi
+    AICallError bilan yakunlanadi. on_retry(kind, attempt, delay) - kuzatuv uchun.
+    """
+    start = time.monotonic()
+    for attempt in range(policy.max_attempts):
+        try:
+            return fn(max(0.0, policy.deadline - (time.monotonic() - start)))
+        except Exception as exc:
+            kind = classify_error(exc)
+            if kind not in RETRYABLE or attempt + 1 >= policy.max_attempts:
+                raise _final_error(kind, exc, attempt + 1)
+            delay = backoff_delay(attempt, policy)
+            hint = retry_after_hint(exc)
+            if hint is not None:
+                delay = max(delay, hint)
+            if time.monotonic() - start + delay > policy.deadline:
+                raise _final_error(kind, exc, attempt + 1)
+            if on_retry:
+                on_retry(kind, attempt + 1, delay)
+            sleep(delay)
+
+
+def check_response(resp) -> None:
+    """Bloklangan javobni (nomzodlarsiz yoki SAFETY bilan to'xtagan) xato sifatida ko'tarish"""
+    feedback = getattr(resp, "prompt_feedback", None)
+    if getattr(feedback, "block_reason", 0) and not getattr(resp, "candidates", None):
+        raise AICallError(SAFETY_BLOCK, ValueError(f"block_reason={feedback.block_reason}"))
+    for cand in getattr(resp, "candidates", None) or ():
+        reason = getattr(cand, "finish_reason", None)
+        name = getattr(reason, "name", str(reason))
+        if name == "SAFETY" and not getattr(getattr(cand, "content", None), "parts", None):
+            raise AICallError(SAFETY_BLOCK, ValueError("finish_reason=SAFETY"))
@@ -2,13 +2,28 @@
 
 import streamlit as st
 import google.generativeai as genai
-from PIL import Image, ImageEnhance, ImageOps, ImageFilter
-import pypdfium2 as pdfium
-import io, gc, base64, json
+from PIL import Image, ImageOps, ImageFilter
+import io, gc, json, os, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from docx import Document
 from supabase import create_client
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from analysis_quality import assess_quality
+from image_pipeline import (
+    BINARIZE_MODES, DEFAULT_PAYLOAD_CODEC, PAYLOAD_CODECS, AdjustmentCache, PipelineStats, PreprocessPipeline, Stage,
+    adjust_image, binarize, codec_for_image, deskew_stage, encode_payload, exif_upright, fused_enhance,
+    sharpen, split_by_line_gaps, to_grayscale, trim_margins,
+)
+from api_retry import AICallError, RetryPolicy, call_with_retries, check_response
+from rate_limit import RateLimiter, estimate_request_tokens
+from result_cache import ResultCache, result_key
+from render_engine import (
+    RenderCache, PdfDocumentPool, ParallelRasterizer, ingest_upload, prune_spool, SpoolRegistry,
+    PageWindow, target_render_scale, make_preview, encode_preview, open_image_frame, load_normalized_image,
+    ANALYSIS_TARGET_PX, PREVIEW_TARGET_PX, PAGE_LOAD_ERRORS,
+)
 
 # ==========================================
 # 1. TIZIM VA SEO SOZLAMALARI
@@ -35,6 +50,8 @@ if "history" not in st.session_state:
     st.session_state.history = []
 if "imgs" not in st.session_state:
     st.session_state.imgs = []
+if "previews" not in st.session_state:
+    st.session_state.previews = []
 if "results" not in st.session_state:
     st.session_state.results = {}
 if "chats" not in st.session_state:
@@ -45,10 +62,8 @@ if "current_page_index" not in st.session_state:
     st.session_state.current_page_index = 0
 if "show_landing" not in st.session_state:
     st.session_state.show_landing = False
-if "file_data" not in st.session_state:
-    st.session_state.file_data = None
-if "is_pdf" not in st.session_state:
-    st.session_state.is_pdf = False
+if "pages" not in st.session_state:
+    st.session_state.pages = []  # PageRef ro'yxati (barcha yuklangan fayllar bo'yicha)
 if "total_pages" not in st.session_state:
     st.session_state.total_pages = 0
 
@@ -1434,16 +1449,10 @@ def safe_deskew(img: Image.Image) -> Image.Image:
     except Exception:
         return img
 
-def adaptive_binarize(img: Image.Image) -> Image.Image:
-    """Matn/fon ajratish - adaptive threshold"""
+def adaptive_binarize(img: Image.Image, method: str = "sauvola") -> Image.Image:
+    """Matn/fon ajratish - lokal adaptiv (Sauvola) yoki global (Otsu) chegara"""
     try:
-        # Grayscale bo'lishi kerak
-        if img.mode != 'L':
-            img = img.convert('L')
-        
-        # Oddiy threshold
-        threshold = 128
-        return img.point(lambda p: 255 if p > threshold else 0)
+        return binarize(img, method)
     except Exception:
         return img
 
@@ -1469,26 +1478,63 @@ def optimal_resize(img: Image.Image, target_size: int = 1800) -> Image.Image:
     except Exception:
         return img
 
-def enhance_image_for_ai(img: Image.Image) -> Image.Image:
+def fit_for_ai(img: Image.Image) -> Image.Image:
+    return optimal_resize(img, target_size=1800)
+
+# Preprocessing rejalari: bosqichlar yozilish tartibida emas, STAGE_ORDER bo'yicha
+# (geometriya/kichraytirish -> chetlarni kesish -> rang -> nuqtaviy -> filtr) bajariladi.
+# Ikkala variant "exif -> deskew -> resize -> trim" prefiksini bo'lishadi: qayta urinishda takrorlanmaydi.
+AI_PRIMARY_PIPELINE = PreprocessPipeline([
+    Stage("exif", "geometry", exif_upright),
+    Stage("deskew", "geometry", deskew_stage),
+    Stage("resize", "resize", fit_for_ai, (1800,)),
+    Stage("trim", "crop", trim_margins),
+    Stage("contrast", "point", lambda im: fused_enhance(im, contrasts=(1.2,)), (1.2,)),
+    Stage("sharpen", "filter", lambda im: sharpen(im, 1.15), (1.15,)),
+])
+AI_RETRY_PIPELINE = PreprocessPipeline([
+    Stage("grayscale", "color", to_grayscale),
+    Stage("exif", "geometry", exif_upright),
+    Stage("deskew", "geometry", deskew_stage),
+    Stage("resize", "resize", fit_for_ai, (1800,)),
+    Stage("trim", "crop", trim_margins),
+    Stage("autocontrast", "point", lambda im: ImageOps.autocontrast(im, cutoff=1), (1,)),
+    Stage("contrast", "point", lambda im: fused_enhance(im, contrasts=(1.8,)), (1.8,)),
+])
+
+def binarize_retry_pipeline(method: str) -> PreprocessPipeline:
+    """Qayta urinish varianti: o'chgan siyoh uchun lokal adaptiv binarizatsiya"""
+    return PreprocessPipeline([
+        Stage("grayscale", "color", to_grayscale),
+        Stage("exif", "geometry", exif_upright),
+        Stage("deskew", "geometry", deskew_stage),
+        Stage("resize", "resize", fit_for_ai, (1800,)),
+        Stage("trim", "crop", trim_margins),
+        Stage(f"binarize_{method}", "filter", lambda im: adaptive_binarize(im, method), (method,)),
+    ])
+
+# Sidebar'dagi "Qayta urinish usuli" -> pipeline
+RETRY_PIPELINES = {
+    "kontrast": AI_RETRY_PIPELINE,
+    **{mode: binarize_retry_pipeline(mode) for mode in BINARIZE_MODES},
+}
+
+def run_pipeline(pipeline: PreprocessPipeline, img: Image.Image, shared: dict = None, timings: list = None) -> Image.Image:
+    """Pipeline'ni ishga tushirish va bosqich vaqtlarini umumiy statistikaga yozish"""
+    timings = [] if timings is None else timings
+    try:
+        return pipeline.run(img, shared, timings)
+    finally:
+        get_pipeline_stats().record(timings)
+
+def enhance_image_for_ai(img: Image.Image, shared: dict = None, timings: list = None) -> Image.Image:
     """Rasmni AI tahlili uchun optimallashtirish
     - RANGLI saqlanadi (siyoh rangi muhim)
     - Engil kontrast/keskinlik (o'chgan siyoh uchun)
     - Grayscale QILINMAYDI
     """
     try:
-        # 1. Optimal o'lchamga keltirish
-        img = optimal_resize(img, target_size=1800)
-        
-        # 2. EXIF rotatsiyasini to'g'rilash
-        img = ImageOps.exif_transpose(img) or img
-        
-        # 3. Engil kontrast (rangli rasmda ham ishlaydi, o'chgan siyohni aniqlashtiradi)
-        img = ImageEnhance.Contrast(img).enhance(1.2)
-        
-        # 4. Engil keskinlik (harflar chegarasini biroz aniqlashtiradi)
-        img = ImageEnhance.Sharpness(img).enhance(1.15)
-        
-        return img
+        return run_pipeline(AI_PRIMARY_PIPELINE, img, shared, timings)
     except Exception:
         return img
 
@@ -1503,40 +1549,10 @@ def should_split_image(img: Image.Image) -> bool:
     return h > 5000 or w > 5000
 
 def split_image_smart(img: Image.Image) -> list:
-    """Rasmni aqlli bo'laklarga bo'lish - OVERLAP KAMAYTIRILDI"""
+    """Rasmni qatorlar oralig'idagi bo'shliqlardan N ta bo'lakka bo'lish - OVERLAP YO'Q
+    (bo'lak uzunligi ~SPLIT_TILE_PX, kesish hech qachon qator ustidan o'tmaydi)"""
     try:
-        w, h = img.size
-        crops = []
-        
-        # Vertikal bo'lish (asosan)
-        if h > w * 1.5:  # Vertikal rasm
-            # 2 qismga bo'lish (FAQAT 3% overlap - qatorlar takrorlanmasligi uchun)
-            mid = h // 2
-            overlap = int(h * 0.03)  # 10%→3%: minimal xavfsizlik chegarasi
-            
-            crop1 = img.crop((0, 0, w, mid + overlap))
-            crop2 = img.crop((0, mid - overlap, w, h))
-            crops = [crop1, crop2]
-        
-        # Gorizontal bo'lish
-        elif w > h * 1.5:  # Gorizontal rasm
-            mid = w // 2
-            overlap = int(w * 0.03)  # 10%→3%
-            
-            crop1 = img.crop((0, 0, mid + overlap, h))
-            crop2 = img.crop((mid - overlap, 0, w, h))
-            crops = [crop1, crop2]
-        
-        # Kvadrat - 4 qismga bo'lmaslik, FAQAT 2 qismga (aniqroq)
-        else:
-            mid_h = h // 2
-            overlap = int(h * 0.03)
-            
-            crop1 = img.crop((0, 0, w, mid_h + overlap))
-            crop2 = img.crop((0, mid_h - overlap, w, h))
-            crops = [crop1, crop2]  # 4→2: kamroq bo'lak = kamroq xato
-        
-        return crops if crops else [img]
+        return split_by_line_gaps(img)
     except Exception:
         return [img]
 
@@ -1605,140 +1621,6 @@ def merge_results(results: list) -> str:
 # ==========================================
 # 3.3 QUALITY-BASED RETRY
 # ==========================================
-def assess_quality(response_text: str) -> dict:
-    """Javob sifatini baholash - KENGAYTIRILGAN VERSIYA"""
-    if not response_text:
-        return {"score": 0, "reason": "Bo'sh javob", "retry": True, "details": {}}
-    
-    text = response_text.lower()
-    
-    # Skor hisoblash
-    score = 100
-    reasons = []
-    details = {}
-    
-    # 1. Noaniqlik belgilari tekshirish (ANIQROQ CHEGARALAR)
-    unclear_count = text.count("[?]") + text.count("unclear") + text.count("noaniq") + text.count("[...]")
-    details['unclear_marks'] = unclear_count
-    
-    if unclear_count > 20:
-        score -= 40
-        reasons.append(f"{unclear_count} noaniq belgi (juda ko'p - rasmni yaxshilang)")
-    elif unclear_count > 12:
-        score -= 25
-        reasons.append(f"{unclear_count} noaniq belgi (ko'p)")
-    elif unclear_count > 6:
-        score -= 12
-        reasons.append(f"{unclear_count} noaniq belgi (o'rtacha)")
-    elif unclear_count > 0:
-        score -= 3
-        reasons.append(f"{unclear_count} noaniq belgi (oz)")
-    
-    # 2. Javob uzunligi tekshirish (ANIQROQ)
-    word_count = len(response_text.split())
-    details['word_count'] = word_count
-    
-    if word_count < 30:
-        score -= 40
-        reasons.append("Juda qisqa javob (kam ma'lumot)")
-    elif word_count < 80:
-        score -= 20
-        reasons.append("Qisqa javob (to'liqroq bo'lishi kerak)")
-    elif word_count < 150:
-        score -= 5
-        reasons.append("Qisqaroq javob")
-    else:
-        score += 5  # Bonus batafsil javob uchun
-    
-    # 3. MAJBURIY bo'limlar tekshirish
-    required_sections = [
-        ("transliteratsiya", "Transliteratsiya bo'limi yo'q", 20),
-        ("tarjima", "Tarjima bo'limi yo'q", 20),
-        ("leksik", "Leksik tahlil yo'q", 15),
-        ("identifikatsiya", "Manba identifikatsiyasi yo'q", 10),
-        ("izoh", "Izohlar bo'limi yo'q", 10),
-    ]
-    
-    missing_sections = []
-    for keyword, error_msg, penalty in required_sections:
-        if keyword not in text:
-            score -= penalty
-            reasons.append(error_msg)
-            missing_sections.append(keyword)
-    details['missing_sections'] = missing_sections
-    
-    # 4. Jadval formati tekshirish (ANIQROQ)
-    table_rows = response_text.count("|")
-    details['table_rows'] = table_rows
-    
-    if table_rows < 3:
-        score -= 15
-        reasons.append("Jadval yo'q yoki to'liq emas")
-    elif table_rows < 8:
-        score -= 5
-        reasons.append("Jadval qisqa (kamida 5-10 qator bo'lishi kerak)")
-    
-    # 5. Xato xabarlari tekshirish
-    error_keywords = ["error", "xato", "imkonsiz", "o'qib bo'lmaydi", "ko'rinmaydi", "butunlay", "yo'q"]
-    found_errors = []
-    for kw in error_keywords:
-        if kw in text and text.count(kw) > 2:  # 2 martadan ko'p
-            found_errors.append(kw)
-    
-    if found_errors:
-        score -= 15
-        reasons.append(f"Ko'p xato belgilari: {', '.join(found_errors[:3])}")
-    details['error_keywords'] = found_errors
-    
-    # 6. Aniqlik bahosi tekshirish (YANGI: sonlarni tekshirish)
-    percent_count = response_text.count("%")
-    details['percent_marks'] = percent_count
-    
-    if percent_count == 0:
-        score -= 10
-        reasons.append("Aniqlik foizlari yo'q")
-    elif percent_count < 3:
-        score -= 5
-        reasons.append("Kamida 3 ta aniqlik foizi bo'lishi kerak")
-    
-    # 7. YANGI: Bo'lim sarlavhalari mavjudligi
-    section_headers = response_text.count("##")
-    details['section_headers'] = section_headers
-    
-    if section_headers < 5:
-        score -= 10
-        reasons.append(f"Faqat {section_headers} ta bo'lim sarlavhasi (kamida 5-7 ta kerak)")
-    
-    # 8. YANGI: Javob strukturasini tekshirish
-    has_good_structure = ("##" in response_text and 
-                         response_text.count("\n\n") > 5 and
-                         len(response_text.split("\n")) > 20)
-    if not has_good_structure:
-        score -= 8
-        reasons.append("Yomon formatlangan javob")
-    details['has_structure'] = has_good_structure
-    
-    # Final skorni hisoblash
-    final_score = max(0, min(100, score))
-    
-    # Sifat darajasini aniqlash
-    if final_score >= 85:
-        quality_level = "A'lo"
-    elif final_score >= 70:
-        quality_level = "Yaxshi"
-    elif final_score >= 55:
-        quality_level = "Qoniqarli"
-    else:
-        quality_level = "Past"
-    
-    return {
-        "score": final_score,
-        "level": quality_level,
-        "reason": ", ".join(reasons) if reasons else "Mukammal sifat",
-        "retry": final_score < 55,  # 55 dan past bo'lsa qayta urinish
-        "details": details
-    }
-
 def generate_quality_report(quality: dict, theme: dict) -> str:
     """Sifat hisobotini HTML formatida yaratish"""
     score = quality['score']
@@ -1782,6 +1664,13 @@ def generate_quality_report(quality: dict, theme: dict) -> str:
         
         metrics_html += "</div>"
     
+    trim = quality.get('trim') or {}
+    if trim.get('pixels_saved'):
+        metrics_html += (
+            f"<p style='font-size:11px; margin:6px 0 0 0; color:rgba(255,255,255,0.6);'>"
+            f"✂️ Chetlar kesildi: {trim['pixels_saved'] / 1e6:.2f} Mpx, ~{trim['bytes_saved'] // 1024} KB payload tejaldi</p>"
+        )
+    
     return f"""
 <div style='background:{bg_color}; padding:16px; border-radius:12px; 
             border-left:4px solid {color}; margin:10px 0; backdrop-filter:blur(10px);'>
@@ -1795,66 +1684,231 @@ def generate_quality_report(quality: dict, theme: dict) -> str:
 </div>
 """
 
-def analyze_with_retry(model, prompt: str, img: Image.Image, max_retries: int = 2) -> tuple:
+def call_gemini(model, parts: list):
+    """model.generate_content - jarayon bo'yi RPM/TPM cheklovchisi va tasniflangan
+    qayta urinishlar orqali.
+
+    Sig'im bo'lmasa 429 o'rniga navbatda kutiladi; vaqtinchalik xatolar (429, 5xx,
+    timeout) backoff + jitter bilan qayta yuboriladi. Qayta yuborib bo'lmaydigan
+    xatolar (noto'g'ri so'rov, xavfsizlik bloki) darhol AICallError bo'lib chiqadi.
+    Har so'rov timeout'i = umumiy muddatdan qolgan vaqt (navbatda kutish ayirilib):
+    osilib qolgan chaqiruv ishchi oqimni abadiy band qilmaydi.
+    """
+    limiter = get_rate_limiter()
+    estimated = estimate_request_tokens(parts)
+
+    def attempt(remaining):
+        waited = limiter.acquire(estimated)
+        timeout = max(API_MIN_REQUEST_TIMEOUT, remaining - waited)
+        resp = model.generate_content(parts, request_options={"timeout": timeout})
+        usage = getattr(resp, "usage_metadata", None)
+        limiter.settle(estimated, getattr(usage, "prompt_token_count", 0) or 0)
+        check_response(resp)
+        return resp
+
+    return call_with_retries(attempt, API_RETRY_POLICY)
+
+def cached_analysis(model, prompt: str, payload: dict, use_cache: bool = True) -> tuple:
+    """(javob matni yoki None, sifat, keshdanmi) - natijalar keshi orqali call_gemini.
+
+    Kalit: payload baytlari + prompt + model + generation_config. Faqat matnli
+    javoblar saqlanadi; use_cache=False bo'lsa kesh o'qilmaydi, lekin yangilanadi.
+    """
+    cache = get_result_cache()
+    model_name = getattr(model, "model_name", str(model))
+    key = result_key(payload, prompt, model_name, generation_config, system_instruction)
+    if use_cache:
+        hit = cache.get(key)
+        if hit is not None:
+            return hit[0], hit[1], True
+    resp = call_gemini(model, [prompt, payload])
+    if not (resp.candidates and resp.candidates[0].content.parts):
+        return None, None, False
+    text = resp.text
+    quality = assess_quality(text)
+    cache.put(key, model_name, text, quality)
+    return text, quality, False
+
+def analyze_with_retry(model, prompt: str, img: Image.Image, max_retries: int = 2, retry_mode: str = "kontrast",
+                       codec: str = None, on_payload=None, use_cache: bool = True) -> tuple:
     """1 ta sifatli so'rov + faqat kerak bo'lsa qayta urinish
     
     OLDIN: har doim 2-3 ta API chaqiruv (dual_pass + retry)
     ENDI:  1 ta chaqiruv, faqat sifat < 50 bo'lsa 1 marta qayta urinish
     NATIJA: 2-3x kamroq API sarfi, tezlik 2x oshadi
+    
+    on_payload(payload) - qaytarilgan natijani bergan AYNAN o'sha payload bilan
+    chaqiriladi (chat keyingi savollarda uni qayta kodlamasdan ishlatadi).
+    Natija butunlay natijalar keshidan olingan bo'lsa quality["cached"] = True.
+    API xatosi bilan tugasa quality["error"] - xato turi (api_retry konstantalari).
     """
     
     # === BIRINCHI SO'ROV: rangli original rasm ===
     result = None
     quality = {"score": 0, "reason": "Natija olinmadi", "retry": True}
+    shared = {}  # asosiy va qayta urinish variantlari uchun umumiy oraliq natijalar
+    timings = []
+    trim = {"pixels_saved": 0, "bytes_saved": 0}
+    payload = None
+    cached = False
     
     try:
-        processed_img = enhance_image_for_ai(img)
-        payload = img_to_png_payload(processed_img)
-        resp = model.generate_content([prompt, payload])
+        processed_img = enhance_image_for_ai(img, shared, timings)
+        payload = img_to_payload(processed_img, codec)
+        trim = trim_savings(timings, payload)
+        text, text_quality, cached = cached_analysis(model, prompt, payload, use_cache)
         
-        if resp.candidates and resp.candidates[0].content.parts:
-            result = resp.text
-            quality = assess_quality(result)
-    except Exception:
-        pass
+        if text:
+            result, quality = text, text_quality
+    except AICallError as e:
+        quality = {"score": 0, "reason": str(e), "retry": e.retryable, "error": e.kind}
+    except Exception as e:
+        quality = {"score": 0, "reason": f"Xatolik: {e}", "retry": True}
+    quality["trim"] = trim
+    quality["cached"] = cached
     
     # Agar yaxshi natija bo'lsa — darhol qaytarish (1 ta API chaqiruv)
     if result and quality["score"] >= 50:
         result = post_process_result(result)
+        if on_payload:
+            on_payload(payload)
         return (result, quality, 1)
     
-    # === QAYTA URINISH: faqat sifat < 50 bo'lsa (grayscale + kontrast) ===
+    # API xatosi (noto'g'ri so'rov, xavfsizlik bloki yoki urinishlari tugagan
+    # vaqtinchalik xato) - boshqa rasm varianti yordam bermaydi, qayta yuborilmaydi
+    if quality.get("error"):
+        return (None, quality, 1)
+    
+    # === QAYTA URINISH: faqat sifat < 50 bo'lsa (grayscale + kontrast yoki binarizatsiya) ===
     try:
-        retry_img = ImageOps.grayscale(img)
-        retry_img = optimal_resize(retry_img, target_size=1800)
-        retry_img = ImageOps.autocontrast(retry_img, cutoff=1)
-        retry_img = ImageEnhance.Contrast(retry_img).enhance(1.8)
+        retry_img = run_pipeline(RETRY_PIPELINES.get(retry_mode, AI_RETRY_PIPELINE), img, shared)
         
-        payload = img_to_png_payload(retry_img)
-        resp = model.generate_content([prompt, payload])
+        retry_payload = img_to_payload(retry_img, codec)
+        retry_result, retry_quality, retry_cached = cached_analysis(model, prompt, retry_payload, use_cache)
+        # Sahifa "bepul" faqat olingan barcha javoblar keshdan kelgan bo'lsa
+        all_cached = retry_cached and (cached or not result)
+        quality["cached"] = all_cached
         
-        if resp.candidates and resp.candidates[0].content.parts:
-            retry_result = resp.text
-            retry_quality = assess_quality(retry_result)
-            
+        if retry_result:
             # Yangi natija yaxshiroq bo'lsa — uni olish
             if retry_quality["score"] > quality["score"]:
+                retry_quality["trim"] = trim
+                retry_quality["cached"] = all_cached
+                if on_payload:
+                    on_payload(retry_payload)
                 return (post_process_result(retry_result), retry_quality, 2)
+    except AICallError as e:
+        if not result:
+            quality = {"score": 0, "reason": str(e), "retry": e.retryable, "error": e.kind, "trim": trim}
     except Exception:
         pass
     
     # Original natijani qaytarish
     if result:
         result = post_process_result(result)
+        if on_payload:
+            on_payload(payload)
     return (result, quality, 1)
 
-def img_to_png_payload(img: Image.Image):
-    """Rasmni PNG formatda AIga yuborish (lossless - nuqtalar saqlanadi)"""
-    buffered = io.BytesIO()
-    if img.mode == 'RGBA':
-        img = img.convert('RGB')
-    img.save(buffered, format="PNG", optimize=False, compress_level=3)
-    return {"mime_type": "image/png", "data": base64.b64encode(buffered.getvalue()).decode("utf-8")}
+def run_in_script_context(ctx, fn, *args, **kwargs):
+    """Ishchi oqimda fn ni Streamlit skript konteksti bilan ishga tushirish
+    (st.cache_resource va st.secrets asosiy oqimdagidek ishlashi uchun)"""
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return fn(*args, **kwargs)
+
+def analyze_crops(model, prompts: list, crops: list, retry_mode: str, codec: str = None, use_cache: bool = True) -> list:
+    """Bitta sahifa qismlarini parallel tahlil qilish (CROP_WORKERS tagacha bir vaqtda).
+
+    Natijalar qismlar TARTIBIDA qaytadi (merge_results uchun). Javobi bo'sh yoki
+    yaroqsiz bo'lgan qismlar CROP_RETRY_ROUNDS marta alohida qayta yuboriladi -
+    muvaffaqiyatli qismlar qayta ishlanmaydi. API xatosi bilan tugagan qismlar
+    qayta yuborilmaydi: noto'g'ri so'rov / xavfsizlik bloki hech qachon
+    takrorlanmaydi, vaqtinchalik xatolar esa call_with_retries urinishlarini tugatgan.
+    """
+    outcomes = [(None, {"score": 0, "reason": "Natija olinmadi"}, 0)] * len(crops)
+    ctx = get_script_run_ctx()
+
+    def run(j):
+        return run_in_script_context(
+            ctx, analyze_with_retry, model, prompts[j], crops[j], max_retries=1, retry_mode=retry_mode, codec=codec,
+            use_cache=use_cache,
+        )
+
+    pending = list(range(len(crops)))
+    with ThreadPoolExecutor(max_workers=max(1, min(CROP_WORKERS, len(crops)))) as executor:
+        for _ in range(1 + CROP_RETRY_ROUNDS):
+            futures = {executor.submit(run, j): j for j in pending}
+            failed = []
+            for future in as_completed(futures):
+                j = futures[future]
+                try:
+                    result, quality, attempts = future.result()
+                except Exception as e:
+                    result, quality, attempts = None, {"score": 0, "reason": f"Xatolik: {e}"}, 1
+                prev_attempts = outcomes[j][2]
+                outcomes[j] = (result, quality, prev_attempts + attempts)
+                if not result and not quality.get("error"):
+                    failed.append(j)
+            if not failed:
+                break
+            pending = sorted(failed)
+    return outcomes
+
+def analyze_page(model, prompt: str, img: Image.Image, retry_mode: str, codec: str = None, on_payload=None,
+                 use_cache: bool = True) -> dict:
+    """Bitta sahifani to'liq tahlil qilish - ishchi oqimda, Streamlit chaqiruvlarisiz.
+
+    Katta sahifa qismlarga bo'linib parallel tahlil qilinadi. Natija:
+    {"result", "quality" (bo'linmaganda), "attempts", "crops" (qismlar soni yoki 0), "issues",
+    "cached" (barcha javoblar natijalar keshidan - kredit yechilmaydi)}.
+    """
+    if not should_split_image(img):
+        result, quality, attempts = analyze_with_retry(
+            model, prompt, img, max_retries=2, retry_mode=retry_mode, codec=codec, on_payload=on_payload,
+            use_cache=use_cache,
+        )
+        return {"result": result, "quality": quality, "attempts": attempts, "crops": 0, "issues": [],
+                "cached": bool(result and quality.get("cached"))}
+    
+    crops = split_image_smart(img)
+    # Har bir qismga ANIQ ko'rsatma berish
+    crop_prompts = [
+        prompt + f"\n\n⚠️ DIQQAT: Bu rasmning {j+1}-QISMI ({len(crops)} qismdan). Faqat SHU rasmdagi matnni o'qi. Oldingi/keyingi qismlar alohida tahlil qilinadi."
+        for j in range(len(crops))
+    ]
+    # Qismlar parallel tahlil qilinadi; natijalar qism tartibida qaytadi
+    crop_results, issues, total_attempts, all_cached = [], [], 0, True
+    outcomes = analyze_crops(model, crop_prompts, crops, retry_mode, codec=codec, use_cache=use_cache)
+    for j, (result, quality, attempts) in enumerate(outcomes):
+        total_attempts += attempts
+        all_cached = all_cached and bool(quality.get("cached"))
+        if result:
+            crop_results.append(result)
+            if quality["score"] < 70:
+                issues.append(f"qism {j+1}: {quality['reason']}")
+        else:
+            issues.append(f"qism {j+1}: natija olinmadi")
+    merged = merge_results(crop_results) if crop_results else None
+    return {"result": merged, "quality": None, "attempts": total_attempts, "crops": len(crops), "issues": issues,
+            "cached": bool(merged and all_cached)}
+
+def trim_savings(timings: list, payload: dict) -> dict:
+    """Chetlarni kesish tejagan piksellar va payload baytlari (kesilgan qismning
+    siqilish darajasi matn bilan bir xil deb olingan taxmin)"""
+    for t in timings:
+        if t.name == "trim" and t.px_out and t.px_in > t.px_out:
+            saved = t.px_in - t.px_out
+            return {"pixels_saved": saved, "bytes_saved": len(payload["data"]) * saved // t.px_out}
+    return {"pixels_saved": 0, "bytes_saved": 0}
+
+def img_to_payload(img: Image.Image, codec: str = None):
+    """Rasmni AIga yuborish - kodek sahifa bo'yicha tanlanadi (ikki rangli rasm doim PNG).
+
+    Inline blob sifatida XOM baytlar yuboriladi: base64 (+33% hajm), qo'shimcha
+    nusxa va UTF-8 decode yo'q. Kodlovchi buferi so'rovgacha o'sha obyekt.
+    """
+    chosen = codec_for_image(img, codec or PAYLOAD_CODEC)
+    return {"mime_type": chosen.mime_type, "data": encode_payload(img, chosen)}
 
 
 def post_process_result(result_text: str) -> str:
@@ -1927,7 +1981,7 @@ def post_process_result(result_text: str) -> str:
 #     # === PASS 1: Standart preprocessing ===
 #     try:
 #         processed_img1 = enhance_image_for_ai(img)
-#         payload1 = img_to_png_payload(processed_img1)
+#         payload1 = img_to_payload(processed_img1)
 #         resp1 = model.generate_content([prompt, payload1])
 #         
 #         if resp1.candidates and resp1.candidates[0].content.parts:
@@ -1948,7 +2002,7 @@ def post_process_result(result_text: str) -> str:
 #         processed_img2 = ImageEnhance.Contrast(processed_img2).enhance(1.5)
 #         processed_img2 = ImageEnhance.Sharpness(processed_img2).enhance(1.3)
 #         
-#         payload2 = img_to_png_payload(processed_img2)
+#         payload2 = img_to_payload(processed_img2)
 #         resp2 = model.generate_content([prompt, payload2])
 #         
 #         if resp2.candidates and resp2.candidates[0].content.parts:
@@ -1997,18 +2051,164 @@ def use_credit_atomic(email: str, count: int = 1):
         return True
     return False
 
-@st.cache_data(show_spinner=False)
-def render_page(file_content, page_idx, scale, is_pdf):
+# ==========================================
+# RENDER KESHI (DISKDA, SESSIYALAR O'RTASIDA UMUMIY)
+# ==========================================
+# st.cache_data butun PDF baytlarini har chaqiruvda hashlardi va rasmlarni
+# RAMda cheklovsiz saqlardi. Endi kalit = (yuklashda bir marta hisoblangan
+# SHA-256, sahifa, scale), rasmlar esa diskda LRU byudjet bilan saqlanadi.
+RENDER_CACHE_DIR = st.secrets.get(
+    "RENDER_CACHE_DIR", os.path.join(tempfile.gettempdir(), "manuscript_ai", "render_cache")
+)
+RENDER_CACHE_MAX_MB = int(st.secrets.get("RENDER_CACHE_MAX_MB", 2048))
+
+@st.cache_resource(show_spinner=False)
+def get_render_cache() -> RenderCache:
+    """Jarayon bo'yi yagona render keshi (barcha sessiyalar uchun)"""
+    return RenderCache(RENDER_CACHE_DIR, RENDER_CACHE_MAX_MB * 1024 * 1024)
+
+# PDF handle pool: hujjat bir marta ochiladi, sessiya davomida tirik turadi
+PDF_POOL_MAX_OPEN = int(st.secrets.get("PDF_POOL_MAX_OPEN", 8))
+PDF_POOL_IDLE_SECONDS = int(st.secrets.get("PDF_POOL_IDLE_SECONDS", 900))
+
+@st.cache_resource(show_spinner=False)
+def get_pdf_pool() -> PdfDocumentPool:
+    """Jarayon bo'yi yagona PdfDocument pooli"""
+    return PdfDocumentPool(max_open=PDF_POOL_MAX_OPEN, idle_timeout=PDF_POOL_IDLE_SECONDS)
+
+# Yuklangan fayllar diskda (kontent-manzilli) saqlanadi - sessiyada faqat havola.
+# Parallel render workerlari ham PDFni shu fayldan o'qiydi.
+SPOOL_DIR = st.secrets.get(
+    "SPOOL_DIR", os.path.join(tempfile.gettempdir(), "manuscript_ai", "uploads")
+)
+SPOOL_MAX_MB = int(st.secrets.get("SPOOL_MAX_MB", 5120))
+# Shuncha vaqt faol bo'lmagan sessiyaning spool fayllari tozalashdan himoyalanmaydi
+SPOOL_SESSION_IDLE_SECONDS = int(st.secrets.get("SPOOL_SESSION_IDLE_SECONDS", 6 * 3600))
+
+@st.cache_resource(show_spinner=False)
+def get_spool_registry() -> SpoolRegistry:
+    """Jarayon bo'yi yagona reestr: barcha sessiyalar ishlatayotgan spool fayllar"""
+    return SpoolRegistry(SPOOL_SESSION_IDLE_SECONDS)
+# Decompression bomb himoyasi: dekodlanadigan rastr uchun piksel byudjeti
+# va ZIP ichidagi bitta faylning ochilgan hajmi (ZIP bomb)
+MAX_ARCHIVE_ENTRY_MB = int(st.secrets.get("MAX_ARCHIVE_ENTRY_MB", 512))
+MAX_DECODE_MP = int(st.secrets.get("MAX_DECODE_MP", 64))
+RENDER_WORKERS = int(st.secrets.get("RENDER_WORKERS", 0)) or None  # None = CPU soni - 1
+
+@st.cache_resource(show_spinner=False)
+def get_rasterizer() -> ParallelRasterizer:
+    """Jarayon bo'yi yagona render process pooli"""
+    return ParallelRasterizer(get_render_cache(), max_workers=RENDER_WORKERS)
+
+def render_page(path: str, page_idx: int, scale: float, file_hash: str):
+    """PDF sahifasini olish (joriy jarayonda): disk keshidan yoki PdfDocument pool orqali.
+    path - spool fayl yo'li, file_hash - yuklashda hisoblangan SHA-256"""
     try:
-        if is_pdf:
-            pdf = pdfium.PdfDocument(file_content)
-            img = pdf[page_idx].render(scale=scale).to_pil()
-            pdf.close()
-            return img
-        return Image.open(io.BytesIO(file_content))
-    except:
+        cache = get_render_cache()
+        img = cache.get(file_hash, page_idx, scale)
+        if img is None:
+            img = get_pdf_pool().render(file_hash, path, page_idx, scale)
+            cache.put(file_hash, page_idx, scale, img)
+        return img
+    except PAGE_LOAD_ERRORS as e:
+        st.warning(f"⚠️ Sahifa {page_idx+1} o'qilmadi: {e}")
         return None
 
+# Sozlangan sahifalar keshi: (sahifa, rot, br, ct) bo'yicha - har rerun'da qayta hisoblanmaydi
+ADJUST_CACHE_MB = int(st.secrets.get("ADJUST_CACHE_MB", 512))
+
+@st.cache_resource(show_spinner=False)
+def get_adjust_cache() -> AdjustmentCache:
+    """Jarayon bo'yi yagona sozlamalar keshi"""
+    return AdjustmentCache(ADJUST_CACHE_MB * 1024 * 1024)
+
+# AI payload kodeki (sidebar'da o'zgartirish mumkin): png1/png3/png6/webp_lossless/webp92/jpeg92
+PAYLOAD_CODEC = st.secrets.get("PAYLOAD_CODEC", DEFAULT_PAYLOAD_CODEC)
+
+# Gemini cheklovlari: bitta API kaliti butun jarayonda (barcha sessiyalar) bo'lishiladi
+GEMINI_RPM = int(st.secrets.get("GEMINI_RPM", 60))
+GEMINI_TPM = int(st.secrets.get("GEMINI_TPM", 1_000_000))
+
+@st.cache_resource(show_spinner=False)
+def get_rate_limiter() -> RateLimiter:
+    """Jarayon bo'yi yagona RPM/TPM cheklovchisi"""
+    return RateLimiter(GEMINI_RPM, GEMINI_TPM)
+
+# API xatolarida qayta urinish: faqat vaqtinchalik xatolar (429/5xx/timeout), umumiy muddat ichida
+API_RETRY_POLICY = RetryPolicy(
+    max_attempts=int(st.secrets.get("API_MAX_ATTEMPTS", 4)),
+    deadline=float(st.secrets.get("API_RETRY_DEADLINE", 180)),
+)
+API_MIN_REQUEST_TIMEOUT = 5.0  # muddat deyarli tugagan bo'lsa ham so'rovga kamida shuncha vaqt
+
+# Sahifalar parallel tahlili: bir vaqtda nechta sahifa API'da bo'lishi mumkin
+ANALYSIS_WORKERS = int(st.secrets.get("ANALYSIS_WORKERS", 4))
+
+# Katta sahifa qismlari (split) parallel tahlili: bir vaqtdagi API so'rovlari chegarasi
+CROP_WORKERS = int(st.secrets.get("CROP_WORKERS", 4))
+CROP_RETRY_ROUNDS = int(st.secrets.get("CROP_RETRY_ROUNDS", 1))  # faqat muvaffaqiyatsiz qismlar uchun
+
+# Sahifa AI payloadlari keshi: chat savollari tahlildagi payloadni qayta ishlatadi.
+# Kalitda sozlamalar (rot/br/ct) bor - ular o'zgarsa eski payload ishlatilmaydi.
+PAYLOAD_CACHE_MB = int(st.secrets.get("PAYLOAD_CACHE_MB", 256))
+
+@st.cache_resource(show_spinner=False)
+def get_payload_cache() -> AdjustmentCache:
+    return AdjustmentCache(PAYLOAD_CACHE_MB * 1024 * 1024)
+
+# Tahlil natijalari keshi (SQLite, diskda): bir xil payload + prompt + model qayta
+# yuborilmaydi va kredit yechilmaydi - rerun, boshqa sessiya yoki boshqa foydalanuvchi uchun ham
+RESULT_CACHE_PATH = st.secrets.get(
+    "RESULT_CACHE_PATH", os.path.join(tempfile.gettempdir(), "manuscript_ai", "results.sqlite3")
+)
+RESULT_CACHE_MAX_MB = int(st.secrets.get("RESULT_CACHE_MAX_MB", 512))
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache() -> ResultCache:
+    """Jarayon bo'yi yagona natijalar keshi"""
+    return ResultCache(RESULT_CACHE_PATH, RESULT_CACHE_MAX_MB * 1024 * 1024)
+
+# Preprocessing bosqichlari statistikasi (vaqt va ajratilgan xotira) - butun jarayon uchun
+@st.cache_resource(show_spinner=False)
+def get_pipeline_stats() -> PipelineStats:
+    return PipelineStats()
+
+# ==========================================
+# OYNALI SAHIFA MODELI (KATTA QO'LYOZMALAR UCHUN)
+# ==========================================
+# Oldin faqat birinchi 15 sahifa ochilardi. Endi istalgan uzunlikdagi hujjat
+# ishlaydi: xotirada faqat cheklangan oyna saqlanadi, tahlil bo'laklab yuradi.
+PAGE_WINDOW_SIZE = int(st.secrets.get("PAGE_WINDOW_SIZE", 12))          # to'liq rastrlar
+PREVIEW_WINDOW_SIZE = int(st.secrets.get("PREVIEW_WINDOW_SIZE", 300))   # previewlar (siqilgan JPEG baytlari, ~50 KB)
+GC_EVERY_PAGES = int(st.secrets.get("GC_EVERY_PAGES", 6))               # tahlilda har N sahifada gc.collect()
+PAGE_PICKER_LIMIT = 15    # Bundan ko'p sahifada multiselect o'rniga oraliq yoziladi
+PREVIEW_GRID_LIMIT = 30   # Tanlash panelida ko'rsatiladigan maksimal varaq
+
+def parse_page_ranges(text: str, total_pages: int) -> list:
+    """'1-10, 15, 20-25' ko'rinishidagi oraliqni 0-asosli indekslarga aylantirish.
+
+    Noto'g'ri yozuvda ValueError ko'taradi (UI ogohlantirish ko'rsatadi).
+    """
+    pages = []
+    seen = set()
+    for part in text.replace(";", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start_s, end_s = part.split("-", 1)
+            start = int(start_s) if start_s.strip() else 1
+            end = int(end_s) if end_s.strip() else total_pages
+        else:
+            start = end = int(part)
+        if start < 1 or end > total_pages or start > end:
+            raise ValueError(f"{part}: 1-{total_pages} oralig'ida bo'lishi kerak")
+        for page in range(start - 1, end):
+            if page not in seen:
+                seen.add(page)
+                pages.append(page)
+    return pages
+
 # ==========================================
 # UI CONSTANTS (DEMO METRICS - NOT LIVE DATA)
 # ==========================================
@@ -2214,6 +2414,21 @@ with st.sidebar:
     br = st.slider("☀️ Yorqinlik", 0.5, 2.0, 1.0, 0.1)
     ct = st.slider("🎭 Kontrast", 0.5, 3.0, 1.3, 0.1)
     rot = st.select_slider("🔄 Aylantirish", options=[0, 90, 180, 270], value=0)
+    retry_mode = st.selectbox(
+        "🔁 Qayta urinish usuli", list(RETRY_PIPELINES), index=0,
+        help="Sifat past bo'lsa ikkinchi so'rov uchun: kontrast yoki o'chgan siyoh uchun binarizatsiya (Sauvola/Otsu)",
+    )
+    codec_names = list(PAYLOAD_CODECS)
+    payload_codec = st.selectbox(
+        "📦 Payload kodeki", codec_names,
+        index=codec_names.index(PAYLOAD_CODEC) if PAYLOAD_CODEC in codec_names else 0,
+        help="AIga yuboriladigan rasm formati: PNG/WebP lossless yoki yuqori sifatli JPEG/WebP (kichikroq, tezroq)",
+    )
+    use_result_cache = st.checkbox(
+        "💾 Saqlangan natijalardan foydalanish", value=True,
+        help="Aynan shu sahifa avval tahlil qilingan bo'lsa natija keshdan olinadi (API chaqiruvi va kredit yo'q). "
+             "O'chirilsa sahifa qayta tahlil qilinadi va kesh yangilanadi",
+    )
 
     st.divider()
     
@@ -2235,6 +2450,31 @@ with st.sidebar:
     
     st.divider()
     
+    # API NAVBATI (barcha sessiyalar uchun umumiy)
+    api_stats = get_rate_limiter().stats()
+    if api_stats["requests"] or api_stats["queue_depth"]:
+        with st.expander(f"🚦 API navbati: {api_stats['queue_depth']} kutmoqda"):
+            st.caption(
+                f"Navbatda: {api_stats['queue_depth']} ta so'rov (eng uzoq kutish {api_stats['oldest_wait_s']} s)  \n"
+                f"Oxirgi kutish: {api_stats['last_wait_s']} s, o'rtacha: {api_stats['avg_wait_s']} s  \n"
+                f"Bo'sh byudjet: {api_stats['rpm_available']}/{GEMINI_RPM} RPM, {api_stats['tpm_available']:,}/{GEMINI_TPM:,} TPM"
+            )
+    
+    # NATIJALAR KESHI (diskda, barcha sessiyalar uchun umumiy)
+    cache_stats = get_result_cache().stats()
+    if cache_stats["entries"] or cache_stats["hits"] or cache_stats["misses"]:
+        with st.expander(f"💾 Natijalar keshi: {cache_stats['hit_rate']:.0%} topildi"):
+            st.caption(
+                f"Topildi: {cache_stats['hits']}, topilmadi: {cache_stats['misses']} (joriy jarayon)  \n"
+                f"Saqlangan natijalar: {cache_stats['entries']} ta, {cache_stats['size_mb']}/{RESULT_CACHE_MAX_MB} MB"
+            )
+    
+    # PREPROCESSING BOSQICHLARI VAQTLARI
+    stage_rows = get_pipeline_stats().rows()
+    if stage_rows:
+        with st.expander("⏱️ Preprocessing bosqichlari"):
+            st.dataframe(stage_rows, hide_index=True, use_container_width=True)
+    
     # KEYBOARD SHORTCUTS INFO
     with st.expander("⌨️ Klaviatura Yorliqlari"):
         st.markdown("""
@@ -2277,9 +2517,14 @@ st.markdown(f"""
     </div>
 """, unsafe_allow_html=True)
 
-file = st.file_uploader("📤 Qo'lyozma faylini yuklang", type=["pdf", "png", "jpg", "jpeg"], label_visibility="visible")
+files = st.file_uploader(
+    "📤 Qo'lyozma fayllarini yuklang (bir nechta fayl yoki ZIP arxiv)",
+    type=["pdf", "png", "jpg", "jpeg", "tif", "tiff", "jp2", "j2k", "jpx", "zip"],
+    accept_multiple_files=True,
+    label_visibility="visible"
+)
 
-if not file:
+if not files:
     # === PREMIUM EMPTY STATE ===
     st.markdown(f"""
         <div style='text-align:center; padding:80px 30px;
@@ -2295,7 +2540,7 @@ if not file:
                        padding:0; position:relative; z-index:1;'>Qo'lyozma yuklang</h3>
             <p style='color:rgba(253,250,241,0.5); font-size:15px; line-height:1.7;
                       max-width:400px; margin:0 auto 24px; position:relative; z-index:1;'>
-                PDF, PNG, JPG yoki JPEG formatidagi fayllarni<br>yuklashingiz mumkin
+                PDF, PNG, JPG, TIFF (ko'p sahifali), JPEG 2000 fayllarni<br>yoki ularning ZIP arxivini yuklashingiz mumkin
             </p>
             <div style='display:flex; justify-content:center; gap:12px; flex-wrap:wrap;
                         position:relative; z-index:1;'>
@@ -2310,64 +2555,213 @@ if not file:
                              border: 1px solid rgba(197,160,89,0.15);'>JPG</span>
                 <span style='background:rgba(197,160,89,0.1); color:{theme['accent']}; padding:6px 14px;
                              border-radius:8px; font-size:0.75rem; font-weight:600;
-                             border: 1px solid rgba(197,160,89,0.15);'>≤ 15 sahifa</span>
+                             border: 1px solid rgba(197,160,89,0.15);'>TIFF</span>
+                <span style='background:rgba(197,160,89,0.1); color:{theme['accent']}; padding:6px 14px;
+                             border-radius:8px; font-size:0.75rem; font-weight:600;
+                             border: 1px solid rgba(197,160,89,0.15);'>JP2</span>
+                <span style='background:rgba(197,160,89,0.1); color:{theme['accent']}; padding:6px 14px;
+                             border-radius:8px; font-size:0.75rem; font-weight:600;
+                             border: 1px solid rgba(197,160,89,0.15);'>ZIP</span>
+                <span style='background:rgba(197,160,89,0.1); color:{theme['accent']}; padding:6px 14px;
+                             border-radius:8px; font-size:0.75rem; font-weight:600;
+                             border: 1px solid rgba(197,160,89,0.15);'>Cheklovsiz sahifa</span>
             </div>
         </div>
     """, unsafe_allow_html=True)
     st.stop()
 
-if file:
-    if st.session_state.get("last_fn") != file.name:
-        with st.spinner("📂 Fayl tayyorlanmoqda..."):
-            data = file.getvalue()
-            st.session_state.file_data = data  # Fayl ma'lumotlarini saqlash
-            st.session_state.is_pdf = (file.type == "application/pdf")
+if files:
+    # Bir nechta fayl / ZIP - bitta umumiy ish (job) sifatida
+    batch_key = tuple((f.name, f.size) for f in files)
+    file_label = files[0].name if len(files) == 1 else f"{len(files)} ta fayl"
+    if st.session_state.get("last_fn") != batch_key:
+        with st.spinner("📂 Fayllar tayyorlanmoqda..."):
+            pool = get_pdf_pool()
+            for old_hash in {ref.file_hash for ref in st.session_state.pages if ref.kind == "pdf"}:
+                # Oldingi fayllarning ochiq handle'larini bo'shatamiz
+                pool.close(old_hash)
+            # Fayllar diskka bo'laklab yoziladi (ZIP ichidagilar ham oqim sifatida) -
+            # sessiyada faqat PageRef havolalari saqlanadi
+            pages, skipped = [], []
+            for f in files:
+                try:
+                    pages.extend(ingest_upload(
+                        f, f.name, SPOOL_DIR, pool, max_pixels=MAX_DECODE_MP * 1_000_000,
+                        max_entry_bytes=MAX_ARCHIVE_ENTRY_MB * 1024 * 1024, warnings=skipped,
+                    ))
+                except Exception as e:
+                    st.warning(f"⚠️ {f.name} o'qilmadi: {e}")
+            for warning in skipped:
+                st.warning(f"⚠️ Arxivdagi fayl o'tkazib yuborildi: {warning}")
+            # Boshqa tirik sessiyalar ishlatayotgan fayllar ham himoyalanadi
+            spool_registry = get_spool_registry()
+            spool_registry.touch(get_script_run_ctx().session_id, {ref.path for ref in pages})
+            prune_spool(SPOOL_DIR, SPOOL_MAX_MB * 1024 * 1024, keep=spool_registry.active_paths())
             
-            if st.session_state.is_pdf:
-                pdf = pdfium.PdfDocument(data)
-                st.session_state.total_pages = min(len(pdf), 15)
-                pdf.close()
-                # LAZY LOAD: faqat sahifa soni hisoblanadi, rasmlar keyinroq yuklanadi
-                st.session_state.imgs = [None] * st.session_state.total_pages
-            else:
-                st.session_state.total_pages = 1
-                st.session_state.imgs = [render_page(data, 0, 1.0, False)]
+            st.session_state.pages = pages
+            st.session_state.total_pages = len(pages)
+            # LAZY LOAD: faqat sahifalar ro'yxati tuziladi, rasmlar keyinroq yuklanadi
+            st.session_state.imgs = PageWindow(PAGE_WINDOW_SIZE)
+            st.session_state.previews = PageWindow(PREVIEW_WINDOW_SIZE)
 
-            st.session_state.last_fn = file.name
+            st.session_state.last_fn = batch_key
             st.session_state.results, st.session_state.chats = {}, {}
             gc.collect()
             st.toast(f"✅ Fayl yuklandi! ({st.session_state.total_pages} sahifa)", icon="📁")
 
-    # LAZY LOAD: dastlab bo'sh list, faqat tanlangan sahifalar yuklanadi
-    processed = [None] * st.session_state.total_pages
+    if not st.session_state.total_pages:
+        st.error("❌ Yuklangan fayllarda o'qiladigan sahifa topilmadi")
+        st.stop()
+    # Sessiya tirik - uning spool fayllari boshqa sessiyalar tozalashidan himoyada qoladi
+    get_spool_registry().touch(get_script_run_ctx().session_id, {ref.path for ref in st.session_state.pages})
+
+    # === IKKI BOSQICHLI RENDER ===
+    # 1) Preview (kichik, tez, keshlangan) - tanlash paneli va natijalar navigatsiyasi uchun
+    # 2) To'liq rastr - FAQAT tahlilga yuborilgan yoki kattalashtirilgan (🔍) sahifalar uchun
+    processed = {}  # faqat xotiradagi oyna uchun
     
-    # Allaqachon yuklangan sahifalarni qayta ishlash (rotate/brightness/contrast)
-    for page_i, im in enumerate(st.session_state.imgs):
-        if im is not None:
-            p = im.rotate(rot, expand=True)
-            p = ImageEnhance.Brightness(p).enhance(br)
-            p = ImageEnhance.Contrast(p).enhance(ct)
-            processed[page_i] = p
+    def adjust_key(idx, tier):
+        ref = st.session_state.pages[idx]
+        return (ref.file_hash, ref.page, tier, rot, br, ct)
 
-    st.markdown("<h3 style='margin-top:30px;'>📑 Varaqlarni Tanlang</h3>", unsafe_allow_html=True)
-    indices = st.multiselect(
-        "Tahlil qilish uchun varaqlarni belgilang:",
-        range(st.session_state.total_pages),
-        default=[0],
-        format_func=lambda x: f"📄 Varaq {x+1}"
-    )
+    def adjusted(idx, im, tier):
+        """Sozlamalar qo'llangan sahifa - faqat (rot, br, ct) o'zgarganda qayta hisoblanadi"""
+        return get_adjust_cache().get_or_compute(adjust_key(idx, tier), lambda: adjust_image(im, rot, br, ct))
 
-    # LAZY LOAD: faqat tanlangan sahifalarni yuklash
-    for idx in indices:
-        if idx < len(processed) and processed[idx] is None and st.session_state.is_pdf:
-            with st.spinner(f"📄 Varaq {idx+1} yuklanmoqda..."):
-                im = render_page(st.session_state.file_data, idx, 4.0, True)
-                st.session_state.imgs[idx] = im
-                p = im.rotate(rot, expand=True)
-                p = ImageEnhance.Brightness(p).enhance(br)
-                p = ImageEnhance.Contrast(p).enhance(ct)
-                processed[idx] = p
+    # Allaqachon yuklangan to'liq sahifalarni qayta ishlash (rotate/brightness/contrast) - keshdan
+    for page_i, im in st.session_state.imgs.items():
+        if im is not None:
+            processed[page_i] = adjusted(page_i, im, "full")
+
+    def load_page_ref(ref, target_px):
+        """Bitta sahifani joriy jarayonda olish (rasm fayllari va fallback uchun)"""
+        if ref.kind == "pdf":
+            scale = target_render_scale(ref.size, target_px)
+            return render_page(ref.path, ref.page, scale, ref.file_hash)
+        # Preview: kadr to'g'ridan-to'g'ri preview o'lchamiga yaqin darajada dekodlanadi
+        # (JPEG draft / JPEG 2000 reduce). Tahlil uchun esa katta fotolar draft bilan
+        # kichraytirib dekodlanadi va normallashgan hosila diskda saqlanadi -
+        # to'liq o'lchamdagi dekod faqat bir marta (yoki umuman) bo'ladi
+        try:
+            if target_px == PREVIEW_TARGET_PX:
+                img = open_image_frame(ref.path, ref.page, target_px=PREVIEW_TARGET_PX,
+                                       max_pixels=MAX_DECODE_MP * 1_000_000)
+                return make_preview(ImageOps.exif_transpose(img) or img)
+            return load_normalized_image(ref.path, ref.file_hash, ref.page, get_render_cache(),
+                                         max_pixels=MAX_DECODE_MP * 1_000_000)
+        except PAGE_LOAD_ERRORS as e:
+            st.warning(f"⚠️ {ref.name} (sahifa {ref.page+1}) o'qilmadi: {e}")
+            return None
+
+    def load_pages(pages, target_px, label):
+        """Sahifalarni parallel render qilish - (idx, rasm) tayyor bo'lishi bilan qaytariladi"""
+        if not pages:
+            return
+        load_bar = st.progress(0, text=f"📄 {len(pages)} ta varaq {label} yuklanmoqda...")
+        refs = st.session_state.pages
+        # PDF sahifalari fayl bo'yicha guruhlanadi - har guruh process pool'da parallel
+        by_pdf, image_pages = {}, []
+        for i in pages:
+            if refs[i].kind == "pdf":
+                by_pdf.setdefault(refs[i].file_hash, []).append(i)
+            else:
+                image_pages.append(i)
+
+        def iter_pages():
+            for i in image_pages:
+                yield i, load_page_ref(refs[i], target_px)
+            for group in by_pdf.values():
+                first = refs[group[0]]
+                local = {refs[i].page: i for i in group}
+                scales = {refs[i].page: target_render_scale(refs[i].size, target_px) for i in group}
+                for page, im in get_rasterizer().render_many(
+                    first.path, first.file_hash, list(local), scales,
+                    fallback=lambda pg: render_page(first.path, pg, scales[pg], first.file_hash),
+                ):
+                    yield local[page], im
+
+        for done, (idx, im) in enumerate(iter_pages(), 1):
+            if im is not None:
+                yield idx, im
+            load_bar.progress(done / len(pages), text=f"📄 Varaq {idx+1} tayyor ({done}/{len(pages)})")
+        load_bar.empty()
+
+    def ensure_full_pages(pages):
+        """To'liq o'lchamdagi rastrni faqat haqiqatan kerak bo'lgan sahifalar uchun yuklash"""
+        missing_full = [i for i in pages if processed.get(i) is None]
+        for idx, im in load_pages(missing_full, ANALYSIS_TARGET_PX, "to'liq sifatda"):
+            st.session_state.imgs[idx] = im
+            processed[idx] = adjusted(idx, im, "full")
+
+    def release_pages(pages):
+        """Tahlil qilingan bo'lak rastrlarini xotiradan chiqarish (kattalashtirilganlar qoladi)"""
+        for i in pages:
+            if not is_magnified(i):
+                processed.pop(i, None)
+                st.session_state.imgs.pop(i)
+
+    def preview_bytes(idx):
+        """Sozlamalar qo'llangan preview - siqilgan JPEG baytlari (keshlangan).
+
+        Preview oynasida PIL rasm (453x640 ~1.2 MB) emas, siqilgan baytlar saqlanadi;
+        sozlama berilgan bo'lsagina bir marta dekodlanib qayta kodlanadi.
+        """
+        data = st.session_state.previews[idx]
+        if not rot and br == 1.0 and ct == 1.0:
+            return data
+        return get_adjust_cache().get_or_compute(
+            adjust_key(idx, "preview_jpeg"),
+            lambda: encode_preview(adjust_image(Image.open(io.BytesIO(data)), rot, br, ct)),
+        )
+
+    def payload_key(idx):
+        """Sahifa payload kaliti: kontent + sozlamalar + kodek + qayta urinish usuli"""
+        return adjust_key(idx, "payload") + (payload_codec, retry_mode)
+
+    def page_payload(idx):
+        """Chat uchun payload: tahlildagi keshdan, bo'lmasa AI uchun tayyorlangan rasmdan"""
+        def build():
+            ensure_full_pages([idx])
+            return img_to_payload(enhance_image_for_ai(processed[idx]), payload_codec)
+        return get_payload_cache().get_or_compute(payload_key(idx), build)
+
+    def is_magnified(idx):
+        return bool(st.session_state.get(f"mag_{idx}"))
+
+    multi_source = len({ref.path for ref in st.session_state.pages}) > 1
+
+    def page_label(idx):
+        """Varaq nomi - bir nechta fayl yuklangan bo'lsa manba fayl nomi bilan"""
+        if multi_source:
+            return f"📄 Varaq {idx+1} · {st.session_state.pages[idx].name}"
+        return f"📄 Varaq {idx+1}"
 
+    st.markdown("<h3 style='margin-top:30px;'>📑 Varaqlarni Tanlang</h3>", unsafe_allow_html=True)
+    if st.session_state.total_pages <= PAGE_PICKER_LIMIT:
+        indices = st.multiselect(
+            "Tahlil qilish uchun varaqlarni belgilang:",
+            range(st.session_state.total_pages),
+            default=[0],
+            format_func=page_label
+        )
+    else:
+        # Katta hujjat: oraliq sintaksisi (masalan: 1-10, 15, 20-25)
+        range_text = st.text_input(
+            f"Tahlil qilish uchun varaqlar oralig'i (jami {st.session_state.total_pages} varaq):",
+            value="1",
+            placeholder="1-10, 15, 20-25",
+            key="page_range"
+        )
+        try:
+            indices = parse_page_ranges(range_text, st.session_state.total_pages)
+        except ValueError as e:
+            st.warning(f"⚠️ Oraliq noto'g'ri: {e}")
+            indices = []
+        if indices:
+            st.caption(f"📄 {len(indices)} ta varaq tanlandi")
+
+    # Tanlangan varaqlar paneli - joylar oldindan yaratiladi, sahifalar tayyor bo'lishi bilan to'ldiriladi
+    page_slots = {}
     if not st.session_state.results and indices:
         st.markdown("<h3 style='margin-top:30px;'>🖼 Tanlangan Varaqlar</h3>", unsafe_allow_html=True)
         
@@ -2378,20 +2772,54 @@ if file:
             with c1:
                 st.markdown(f"<h4>📄 Varaq {indices[0]+1}</h4>", unsafe_allow_html=True)
                 st.markdown('<div class="magnifier-container">', unsafe_allow_html=True)
-                st.image(processed[indices[0]], use_container_width=True)
+                page_slots[indices[0]] = (st.empty(), None)
                 st.markdown("</div>", unsafe_allow_html=True)
+                st.checkbox("🔍 To'liq sifat", key=f"mag_{indices[0]}")
             with c2:
                 st.markdown(f"<h4>📄 Varaq {indices[1]+1}</h4>", unsafe_allow_html=True)
                 st.markdown('<div class="magnifier-container">', unsafe_allow_html=True)
-                st.image(processed[indices[1]], use_container_width=True)
+                page_slots[indices[1]] = (st.empty(), None)
                 st.markdown("</div>", unsafe_allow_html=True)
+                st.checkbox("🔍 To'liq sifat", key=f"mag_{indices[1]}")
         else:
-            cols = st.columns(min(len(indices), 3))
-            for i, idx in enumerate(indices):
+            grid_indices = indices[:PREVIEW_GRID_LIMIT]
+            if len(indices) > PREVIEW_GRID_LIMIT:
+                st.info(f"ℹ️ Dastlabki {PREVIEW_GRID_LIMIT} ta varaq ko'rsatilmoqda, tahlil barcha {len(indices)} ta varaq bo'yicha o'tadi")
+            cols = st.columns(min(len(grid_indices), 3))
+            for i, idx in enumerate(grid_indices):
                 with cols[i % 3]:
                     st.markdown('<div class="magnifier-container">', unsafe_allow_html=True)
-                    st.image(processed[idx], caption=f"Varaq {idx+1}", use_container_width=True)
+                    page_slots[idx] = (st.empty(), f"Varaq {idx+1}")
                     st.markdown("</div>", unsafe_allow_html=True)
+                    st.checkbox("🔍 To'liq sifat", key=f"mag_{idx}")
+
+    def show_page_slot(idx):
+        if idx not in page_slots:
+            return
+        slot, caption = page_slots[idx]
+        if is_magnified(idx) and processed.get(idx) is not None:
+            slot.image(processed[idx], caption=caption, use_container_width=True)
+        elif st.session_state.previews[idx] is not None:
+            slot.image(preview_bytes(idx), caption=caption, use_container_width=True)
+
+    for idx in page_slots:
+        show_page_slot(idx)
+
+    # LAZY LOAD: avval tanlangan (va natijadagi) sahifalarning previewlari - PARALLEL
+    preview_targets = sorted(set(page_slots) | set(st.session_state.results.keys()))
+    # Ko'rsatiladigan barcha previewlar oynaga sig'ishi kerak - aks holda har rerun'da qayta yuklanadi
+    st.session_state.previews.ensure_capacity(len(preview_targets))
+    missing = [idx for idx in preview_targets
+               if idx < st.session_state.total_pages and st.session_state.previews[idx] is None]
+    for idx, im in load_pages(missing, PREVIEW_TARGET_PX, "preview"):
+        st.session_state.previews[idx] = encode_preview(im)
+        show_page_slot(idx)
+
+    # Kattalashtirilgan sahifalar - to'liq sifatga progressiv yangilash
+    magnified = [idx for idx in preview_targets if is_magnified(idx)]
+    ensure_full_pages(magnified)
+    for idx in magnified:
+        show_page_slot(idx)
 
     st.markdown("<br>", unsafe_allow_html=True)
     
@@ -2516,46 +2944,80 @@ Yuqoridagi AYNI raqamlar bilan lotin alifbosida yoz (raqamlar MOS kelishi SHART)
             total_attempts = 0
             quality_issues = []
             
-            for i, idx in enumerate(indices):
-                with st.status(f"🔍 Varaq {idx+1} ekspertizadan o'tkazilmoqda...") as status:
-                    try:
-                        current_img = processed[idx]
-                        
-                        # === SMART CROPPING CHECK ===
-                        if should_split_image(current_img):
-                            status.update(label=f"📐 Varaq {idx+1} bo'laklarga bo'linmoqda...")
-                            crops = split_image_smart(current_img)
-                            crop_results = []
-                            
-                            for j, crop in enumerate(crops):
-                                status.update(label=f"🔍 Varaq {idx+1} - Qism {j+1}/{len(crops)}...")
-                                # Har bir qismga ANIQ ko'rsatma berish
-                                crop_prompt = prompt + f"\n\n⚠️ DIQQAT: Bu rasmning {j+1}-QISMI ({len(crops)} qismdan). Faqat SHU rasmdagi matnni o'qi. Oldingi/keyingi qismlar alohida tahlil qilinadi."
-                                result, quality, attempts = analyze_with_retry(model, crop_prompt, crop, max_retries=1)
-                                total_attempts += attempts
-                                
-                                if result:
-                                    crop_results.append(result)
-                                    if quality["score"] < 70:
-                                        quality_issues.append(f"Varaq {idx+1} qism {j+1}: {quality['reason']}")
+            # Sahifalar ANALYSIS_WORKERS tagacha parallel tahlil qilinadi. Xotirada faqat
+            # "parvozdagi" sahifalar rastrlari turadi: bittasi tugashi bilan rastri
+            # bo'shatiladi va navbatdagi sahifa yuklanib yuboriladi.
+            payload_cache = get_payload_cache()
+            ctx = get_script_run_ctx()
+            queue = list(indices)
+            in_flight = {}  # future -> idx
+            statuses = {}
+            done_count = 0
+            cached_pages = 0
+            
+            def show_progress():
+                progress_percent = done_count/len(indices)
+                progress_bar.progress(
+                    progress_percent,
+                    text=f"📊 {done_count}/{len(indices)} varaq tahlil qilindi ({int(progress_percent*100)}%)"
+                         + (f", {cached_pages} tasi keshdan" if cached_pages else ""),
+                )
+            
+            with ThreadPoolExecutor(max_workers=max(1, ANALYSIS_WORKERS)) as executor:
+                while queue or in_flight:
+                    # Bo'sh o'rinlarni to'ldirish
+                    batch = queue[:max(1, ANALYSIS_WORKERS) - len(in_flight)]
+                    del queue[:len(batch)]
+                    if batch:
+                        ensure_full_pages(batch)
+                    for idx in batch:
+                        page_img = processed.get(idx)
+                        if page_img is None:
+                            # Rastr yuklanmadi (buzilgan sahifa) - faqat shu sahifa o'tkazib yuboriladi
+                            st.status(f"⚠️ Varaq {idx+1} yuklanmadi", state="error").error(
+                                f"❌ Varaq {idx+1} rasmini o'qib bo'lmadi - tahlil qilinmadi"
+                            )
+                            quality_issues.append(f"Varaq {idx+1}: sahifa yuklanmadi")
+                            done_count += 1
+                            show_progress()
+                            continue
+                        statuses[idx] = st.status(f"🔍 Varaq {idx+1} ekspertizadan o'tkazilmoqda...")
+                        key = payload_key(idx)
+                        future = executor.submit(
+                            run_in_script_context, ctx, analyze_page, model, prompt, page_img, retry_mode,
+                            codec=payload_codec, on_payload=lambda p, key=key: payload_cache.put(key, p),
+                            use_cache=use_result_cache,
+                        )
+                        in_flight[future] = idx
+                    if not in_flight:
+                        continue
+                    
+                    # Birinchi tugagan sahifani qayta ishlash (xatolar faqat o'sha sahifaga tegishli)
+                    finished = next(as_completed(in_flight))
+                    idx = in_flight.pop(finished)
+                    status = statuses.pop(idx)
+                    with status:
+                        try:
+                            outcome = finished.result()
+                            total_attempts += outcome["attempts"]
+                            result, quality = outcome["result"], outcome["quality"]
+                            quality_issues.extend(f"Varaq {idx+1} {issue}" for issue in outcome["issues"])
                             
-                            if crop_results:
-                                st.session_state.results[idx] = merge_results(crop_results)
+                            # Keshdan olingan natija uchun kredit yechilmaydi
+                            if result and not outcome["cached"]:
                                 use_credit_atomic(st.session_state.u_email)
-                                st.toast(f"✅ Varaq {idx+1} tayyor! ({len(crops)} qism)", icon="🎉")
-                                st.success(f"✅ Varaq {idx+1} muvaffaqiyatli tahlil qilindi")
-                            else:
-                                st.error(f"⚠️ Varaq {idx+1} tahlil qilinmadi")
-                        
-                        else:
-                            # === NORMAL ANALYSIS WITH RETRY ===
-                            result, quality, attempts = analyze_with_retry(model, prompt, current_img, max_retries=2)
-                            total_attempts += attempts
+                            if result and outcome["cached"]:
+                                cached_pages += 1
+                                st.caption("💾 Natija keshdan olindi - kredit yechilmadi")
                             
-                            if result:
+                            if result and outcome["crops"]:
                                 st.session_state.results[idx] = result
-                                use_credit_atomic(st.session_state.u_email)
-                                
+                                st.toast(f"✅ Varaq {idx+1} tayyor! ({outcome['crops']} qism)", icon="🎉")
+                                st.success(f"✅ Varaq {idx+1} muvaffaqiyatli tahlil qilindi")
+                                status.update(label=f"✅ Varaq {idx+1} tayyor ({outcome['crops']} qism)", state="complete")
+                            elif result:
+                                st.session_state.results[idx] = result
+                            
                                 # Quality indicator
                                 # Sifat bo'yicha xabar berish (YANGI CHEGARALAR)
                                 if quality["score"] >= 85:
@@ -2568,24 +3030,36 @@ Yuqoridagi AYNI raqamlar bilan lotin alifbosida yoz (raqamlar MOS kelishi SHART)
                                 else:
                                     st.toast(f"❌ Varaq {idx+1} - Past sifat", icon="❌")
                                     quality_issues.append(f"Varaq {idx+1}: {quality['reason']}")
-                                
+                            
                                 # YANGI: Batafsil sifat hisobotini session_state'ga saqlash
                                 if 'quality_reports' not in st.session_state:
                                     st.session_state.quality_reports = {}
                                 st.session_state.quality_reports[idx] = quality
-                                
-                                if attempts > 1:
-                                    st.info(f"ℹ️ {attempts} urinishda tahlil qilindi")
+                            
+                                if outcome["attempts"] > 1:
+                                    st.info(f"ℹ️ {outcome['attempts']} urinishda tahlil qilindi")
                                 st.success(f"✅ Varaq {idx+1} muvaffaqiyatli tahlil qilindi")
+                                status.update(label=f"✅ Varaq {idx+1} tayyor", state="complete")
+                            elif outcome["crops"]:
+                                st.error(f"⚠️ Varaq {idx+1} tahlil qilinmadi")
+                                status.update(label=f"⚠️ Varaq {idx+1} tahlil qilinmadi", state="error")
                             else:
-                                st.error(f"⚠️ Varaq {idx+1}: AI javob berish imkoniyatiga ega emas")
-                                
-                    except Exception as e:
-                        st.error(f"❌ Xatolik yuz berdi: {e}")
-                
-                # Update progress with custom styling
-                progress_percent = (i+1)/len(indices)
-                progress_bar.progress(progress_percent, text=f"📊 {i+1}/{len(indices)} varaq tahlil qilindi ({int(progress_percent*100)}%)")
+                                reason = quality.get("reason") if quality and quality.get("error") else None
+                                st.error(f"⚠️ Varaq {idx+1}: AI javob berish imkoniyatiga ega emas" + (f" ({reason})" if reason else ""))
+                                status.update(label=f"⚠️ Varaq {idx+1} tahlil qilinmadi", state="error")
+                        except Exception as e:
+                            st.error(f"❌ Xatolik yuz berdi: {e}")
+                            status.update(label=f"❌ Varaq {idx+1}: xatolik", state="error")
+                    
+                    # Update progress with custom styling
+                    done_count += 1
+                    show_progress()
+                    
+                    # Tugagan sahifa rastrini darhol bo'shatamiz
+                    release_pages([idx])
+                    if done_count % GC_EVERY_PAGES == 0:
+                        gc.collect()
+            gc.collect()
             
             # === QUALITY SUMMARY ===
             if quality_issues:
@@ -2598,7 +3072,7 @@ Yuqoridagi AYNI raqamlar bilan lotin alifbosida yoz (raqamlar MOS kelishi SHART)
             st.session_state.history.append({
                 'id': datetime.now().timestamp(),
                 'date': datetime.now().strftime("%d.%m.%Y %H:%M"),
-                'filename': file.name,
+                'filename': file_label,
                 'results': st.session_state.results.copy(),
                 'chats': st.session_state.chats.copy(),
                 'quality_issues': quality_issues,
@@ -2640,7 +3114,7 @@ Yuqoridagi AYNI raqamlar bilan lotin alifbosida yoz (raqamlar MOS kelishi SHART)
                         📊 Akademik Ekspertiza Natijasi
                     </h2>
                     <p style='margin:6px 0 0; color:rgba(253,250,241,0.45); font-size:13px;'>
-                        {result_count} varaq tahlil qilindi · {file.name}
+                        {result_count} varaq tahlil qilindi · {file_label}
                     </p>
                 </div>
                 <div style='display:flex; gap:8px; flex-wrap:wrap;'>
@@ -2704,8 +3178,12 @@ Yuqoridagi AYNI raqamlar bilan lotin alifbosida yoz (raqamlar MOS kelishi SHART)
 
             with c1:
                 st.markdown('<div class="magnifier-container">', unsafe_allow_html=True)
-                st.image(processed[idx], use_container_width=True)
+                if is_magnified(idx) and processed.get(idx) is not None:
+                    st.image(processed[idx], use_container_width=True)
+                elif st.session_state.previews[idx] is not None:
+                    st.image(preview_bytes(idx), use_container_width=True)
                 st.markdown("</div>", unsafe_allow_html=True)
+                st.checkbox("🔍 To'liq sifat", key=f"mag_{idx}")
 
             with c2:
                 # YANGI: Sifat hisobotini ko'rsatish
@@ -2749,6 +3227,8 @@ Yuqoridagi AYNI raqamlar bilan lotin alifbosida yoz (raqamlar MOS kelishi SHART)
                 if st.button(f"📤 So'rash", key=f"btn_{idx}"):
                     if q:
                         with st.spinner("🤖 AI javob tayyorlayapti..."):
+                            # Tahlilda ishlatilgan AYNAN o'sha payload (kesh); yo'q bo'lsa - bir marta tayyorlanadi
+                            chat_payload = page_payload(idx)
                             chat_prompt = f"""Sen qadimiy qo'lyozmalar bo'yicha EKSPERT sifatida javob ber.
 
 ═══════════════════════════════════════════
@@ -2772,13 +3252,17 @@ JAVOB QOIDALARI:
 4. Agar javob tahlilda YO'Q bo'lsa - RASMNI qayta ko'rib javob ber
 5. Agar umuman javob berib bo'lmasa - sababini aniq tushuntir
 6. Taxminiy javob bo'lsa - [TAXMIN] deb belgilab ber"""
-                            chat_res = model.generate_content([
-                                chat_prompt,
-                                img_to_png_payload(processed[idx])
-                            ])
-                            st.session_state.chats[idx].append({"q": q, "a": chat_res.text})
-                            st.toast("✅ Javob olindi!", icon="💬")
-                            st.rerun()
+                            try:
+                                chat_res = call_gemini(model, [
+                                    chat_prompt,
+                                    chat_payload
+                                ])
+                            except AICallError as e:
+                                st.error(f"❌ Javob olinmadi: {e}")
+                            else:
+                                st.session_state.chats[idx].append({"q": q, "a": chat_res.text})
+                                st.toast("✅ Javob olindi!", icon="💬")
+                                st.rerun()
                     else:
                         st.warning("⚠️ Iltimos, avval savol yozing!")
 
@@ -2814,7 +3298,7 @@ JAVOB QOIDALARI:
                         "date": today,
                         "language": lang,
                         "script": era,
-                        "filename": file.name,
+                        "filename": file_label,
                         "user": st.session_state.u_email
                     },
                     "results": st.session_state.results,
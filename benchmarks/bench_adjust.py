@@ -0,0 +1,72 @@
+# File: benchmarks/bench_adjust.py
+"""Sozlash benchmarki: PIL zanjiri (Brightness -> Contrast -> Contrast 1.2 -> Sharpness 1.15)
+VS bitta LUT + bitta 3x3 yadro (image_pipeline.fused_enhance).
+
+Ishga tushirish (loyiha ildizidan):
+    python benchmarks/bench_adjust.py                  # sintetik 300 dpi A4 sahifa
+    python benchmarks/bench_adjust.py page.png 1.1 1.3 # o'z rasmingiz, br va ct
+
+Ikkala natija o'rtasidagi piksel farqi ham chiqariladi (PIL har bosqichda
+8 bitga yaxlitlaydi, LUT bosqichlari buni takrorlaydi - farq 1-2 birlik).
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from image_pipeline import fused_enhance, legacy_adjust_chain  # noqa: E402
+
+AI_CONTRAST = 1.2
+AI_SHARPNESS = 1.15
+REPEATS = 5
+
+
+def make_sample_page() -> Image.Image:
+    """300 dpi A4 skanga o'xshash to'liq o'lchamli rangli sahifa"""
+    size = (2480, 3508)
+    paper = Image.effect_noise(size, 25).point(lambda v: v // 4 + 180)
+    ink = Image.effect_noise(size, 90)
+    return Image.merge("RGB", (paper, ink.point(lambda v: v // 2 + 90), paper))
+
+
+def best_of(fn, repeats: int = REPEATS) -> tuple:
+    times = []
+    out = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), out
+
+
+def main() -> None:
+    if len(sys.argv) >= 2:
+        img = Image.open(sys.argv[1]).convert("RGB")
+        br = float(sys.argv[2]) if len(sys.argv) >= 3 else 1.1
+        ct = float(sys.argv[3]) if len(sys.argv) >= 4 else 1.3
+    else:
+        img = make_sample_page()
+        br, ct = 1.1, 1.3
+
+    print(f"Rasm: {img.size[0]}x{img.size[1]}  br={br}  ct={ct}  (eng yaxshisi {REPEATS} ta urinishdan)")
+    legacy_t, legacy = best_of(lambda: legacy_adjust_chain(img, br, ct, AI_CONTRAST, AI_SHARPNESS))
+    fused_t, fused = best_of(lambda: fused_enhance(img, br, (ct, AI_CONTRAST), AI_SHARPNESS))
+
+    # Faqat nuqtaviy qism (keskinliksiz): 3 ta PIL o'tishi VS bitta LUT o'tishi
+    legacy_pt, _ = best_of(lambda: legacy_adjust_chain(img, br, ct, AI_CONTRAST, 1.0))
+    fused_pt, _ = best_of(lambda: fused_enhance(img, br, (ct, AI_CONTRAST)))
+
+    diff = np.abs(np.asarray(legacy, dtype=np.int16) - np.asarray(fused, dtype=np.int16))
+    print(f"{'rejim':<10}{'umumiy (s)':>12}{'keskinliksiz (s)':>18}")
+    print(f"{'legacy':<10}{legacy_t:>12.3f}{legacy_pt:>18.3f}")
+    print(f"{'fused':<10}{fused_t:>12.3f}{fused_pt:>18.3f}   x{legacy_t / fused_t:.1f} / x{legacy_pt / fused_pt:.1f}")
+    print(f"Piksel farqi: o'rtacha {diff.mean():.3f}, maksimal {int(diff.max())}")
+
+
+if __name__ == "__main__":
+    main()
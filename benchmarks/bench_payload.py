@@ -0,0 +1,164 @@
+# File: benchmarks/bench_payload.py
+"""Payload kodeklari benchmarki: kodlash vaqti, payload hajmi, piksel aniqligi
+(PSNR), bitta so'rov payloadining peak xotirasi (eski base64 str VS xom baytlar)
+va ixtiyoriy ravishda Gemini javobining assess_quality bahosi.
+
+Ishga tushirish (loyiha ildizidan):
+    python benchmarks/bench_payload.py                          # sintetik sahifa
+    python benchmarks/bench_payload.py scans/ page1.png doc.pdf # etalon qo'lyozmalar
+    GEMINI_API_KEY=... python benchmarks/bench_payload.py scans/ --gemini [--prompt-file prompt.txt]
+
+Rasmlar app'dagi kabi AI pipeline o'lchamiga (1800 px) keltiriladi. --gemini
+bilan har bir kodek payloadi modelga yuboriladi va javob app'dagi
+assess_quality bilan baholanadi (API kvotasi sarflanadi!).
+"""
+
+import base64
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from analysis_quality import assess_quality  # noqa: E402
+from image_pipeline import PAYLOAD_CODECS, encode_payload  # noqa: E402
+from render_engine import ANALYSIS_TARGET_PX, PdfDocumentPool, file_sha256, target_render_scale  # noqa: E402
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".webp", ".jp2")
+REPEATS = 3
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-flash-latest")  # app.py dagi model
+# Qisqa prompt: assess_quality tekshiradigan majburiy bo'limlarni so'raydi
+DEFAULT_PROMPT = """Qo'lyozma sahifasini tahlil qil. Markdown (##) sarlavhalar bilan quyidagi bo'limlarni yoz:
+## Manba identifikatsiyasi, ## Transliteratsiya, ## Tarjima, ## Leksik tahlil (jadval |...|), ## Izohlar.
+Har bir bo'lim uchun aniqlik foizini (%) ko'rsat, o'qilmagan joylarni [?] bilan belgila."""
+
+
+def make_sample_page() -> Image.Image:
+    """Qog'oz fakturasi va siyoh qatorlari bo'lgan sintetik 1800 px sahifa"""
+    w, h = 1272, 1800
+    rng = np.random.default_rng(7)
+    page = np.full((h, w, 3), (228, 214, 182), dtype=np.int16) + rng.integers(-12, 12, (h, w, 1))
+    for y in range(120, h - 120, 54):
+        x = 100
+        while x < w - 160:
+            word = int(rng.integers(30, 140))
+            page[y:y + 24, x:x + word] = (58, 42, 30)
+            x += word + int(rng.integers(14, 36))
+    return Image.fromarray(np.clip(page, 0, 255).astype(np.uint8), "RGB")
+
+
+def load_references(paths: list) -> list:
+    """(nom, rasm) ro'yxati - kataloglar, rasmlar va PDF sahifalari"""
+    pages = []
+    pool = PdfDocumentPool()
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(n for n in os.listdir(path) if n.lower().endswith(IMAGE_EXTS + (".pdf",)))
+            pages.extend(load_references([os.path.join(path, n) for n in names]))
+        elif path.lower().endswith(".pdf"):
+            with open(path, "rb") as f:
+                data = f.read()
+            key = file_sha256(data)
+            for idx, size in enumerate(pool.page_sizes(key, data)):
+                img = pool.render(key, data, idx, target_render_scale(size, ANALYSIS_TARGET_PX))
+                pages.append((f"{os.path.basename(path)}#{idx + 1}", img))
+        else:
+            img = Image.open(path)
+            img.load()
+            img = img.convert("RGB")
+            img.thumbnail((ANALYSIS_TARGET_PX, ANALYSIS_TARGET_PX), Image.Resampling.LANCZOS)
+            pages.append((os.path.basename(path), img))
+    return pages
+
+
+def psnr(original: Image.Image, data: bytes) -> float:
+    decoded = np.asarray(Image.open(io.BytesIO(data)).convert(original.mode), dtype=np.float64)
+    mse = float(((np.asarray(original, dtype=np.float64) - decoded) ** 2).mean())
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def legacy_payload(img: Image.Image, codec) -> dict:
+    """Oldingi yo'l: kodlash -> base64 -> UTF-8 str"""
+    return {"mime_type": codec.mime_type, "data": base64.b64encode(encode_payload(img, codec)).decode("utf-8")}
+
+
+def raw_payload(img: Image.Image, codec) -> dict:
+    """Hozirgi app.img_to_payload: kodlovchi baytlari to'g'ridan-to'g'ri inline blob"""
+    return {"mime_type": codec.mime_type, "data": encode_payload(img, codec)}
+
+
+def peak_bytes(build, img: Image.Image, codec) -> tuple:
+    """(payload hajmi, so'rov payloadini qurishdagi peak ajratilgan xotira) - tracemalloc bilan"""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    payload = build(img, codec)
+    size = len(payload["data"])
+    peak = tracemalloc.get_traced_memory()[1]
+    del payload
+    tracemalloc.stop()
+    return size, peak
+
+
+def gemini_score(model, prompt: str, codec, data: bytes) -> int:
+    payload = {"mime_type": codec.mime_type, "data": data}
+    resp = model.generate_content([prompt, payload])
+    text = resp.text if resp.candidates and resp.candidates[0].content.parts else ""
+    return assess_quality(text)["score"]
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    use_gemini = "--gemini" in args
+    prompt = DEFAULT_PROMPT
+    if "--prompt-file" in args:
+        i = args.index("--prompt-file")
+        with open(args[i + 1], encoding="utf-8") as f:
+            prompt = f.read()
+        del args[i:i + 2]
+    paths = [a for a in args if a != "--gemini"]
+
+    pages = load_references(paths) if paths else [("sintetik", make_sample_page())]
+    model = None
+    if use_gemini:
+        import google.generativeai as genai
+        genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+        model = genai.GenerativeModel(GEMINI_MODEL)
+
+    print(f"Sahifalar: {len(pages)}  (kodlash vaqti - eng yaxshisi {REPEATS} ta urinishdan)")
+    header = f"{'kodek':<15}{'kodlash (ms)':>14}{'payload (KB)':>14}{'PSNR (dB)':>11}"
+    print(header + (f"{'assess_quality':>16}" if model else ""))
+    for codec in PAYLOAD_CODECS.values():
+        enc_ms, sizes, psnrs, scores = [], [], [], []
+        for _, img in pages:
+            best, data = None, b""
+            for _ in range(REPEATS):
+                start = time.perf_counter()
+                data = encode_payload(img, codec)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            enc_ms.append(best * 1000)
+            sizes.append(len(data) / 1024)
+            psnrs.append(psnr(img, data))
+            if model:
+                scores.append(gemini_score(model, prompt, codec, data))
+        line = f"{codec.name:<15}{np.mean(enc_ms):>14.1f}{np.mean(sizes):>14.1f}{np.mean(psnrs):>11.1f}"
+        print(line + (f"{np.mean(scores):>16.1f}" if model else ""))
+
+    print()
+    print("Bitta so'rov payloadi: hajm va peak xotira (MB)")
+    print(f"{'kodek':<15}{'base64 str':>12}{'peak':>9}{'xom bayt':>12}{'peak':>9}")
+    for codec in PAYLOAD_CODECS.values():
+        img = pages[0][1]
+        legacy_size, legacy_peak = peak_bytes(legacy_payload, img, codec)
+        raw_size, raw_peak = peak_bytes(raw_payload, img, codec)
+        mb = 1024 * 1024
+        print(f"{codec.name:<15}{legacy_size / mb:>12.2f}{legacy_peak / mb:>9.2f}{raw_size / mb:>12.2f}{raw_peak / mb:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# File: benchmarks/bench_render.py
+"""Render benchmarki: qat'iy scale=4.0 + optimal_resize  VS  MediaBox asosidagi scale.
+
+Ishga tushirish (loyiha ildizidan):
+    python benchmarks/bench_render.py                 # sintetik A4 skan
+    python benchmarks/bench_render.py codex.pdf 0 1 2 # o'z faylingiz va sahifalar
+
+Har bir rejim ALOHIDA jarayonda ishlaydi, shuning uchun peak RSS
+(ru_maxrss) bir-biriga aralashmaydi. Linux ru_maxrss ni exec orqali
+meros qiladi, shuning uchun sintetik fayl ham alohida jarayonda yaratiladi.
+"""
+
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from render_engine import ANALYSIS_TARGET_PX, PdfDocumentPool, file_sha256, target_render_scale  # noqa: E402
+
+LEGACY_SCALE = 4.0
+
+
+def legacy_resize(img: Image.Image, target_size: int = 1800) -> Image.Image:
+    """app.optimal_resize dagi kichraytirish shoxobchasi (2200 px dan katta bo'lsa)"""
+    w, h = img.size
+    if max(w, h) > 2200:
+        scale = target_size / max(w, h)
+        return img.resize((int(w * scale), int(h * scale)), Image.Resampling.LANCZOS)
+    return img
+
+
+def make_sample_pdf() -> bytes:
+    """300 dpi A4 skanga o'xshash sintetik PDF (2 sahifa)"""
+    pages = []
+    for seed in range(2):
+        noise = Image.effect_noise((2480, 3508), 40 + seed).convert("RGB")
+        pages.append(noise)
+    buf = io.BytesIO()
+    pages[0].save(buf, format="PDF", resolution=300, save_all=True, append_images=pages[1:])
+    return buf.getvalue()
+
+
+def run_mode(mode: str, pdf_path: str, pages: list) -> None:
+    with open(pdf_path, "rb") as f:
+        data = f.read()
+    pool = PdfDocumentPool()
+    key = file_sha256(data)
+    sizes = pool.page_sizes(key, data)
+    base_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux: KB
+
+    start = time.perf_counter()
+    out_sizes = []
+    for idx in pages:
+        if mode == "legacy":
+            img = legacy_resize(pool.render(key, data, idx, LEGACY_SCALE))
+        else:
+            img = pool.render(key, data, idx, target_render_scale(sizes[idx], ANALYSIS_TARGET_PX))
+        out_sizes.append(img.size)
+        del img
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode}\t{elapsed:.3f}\t{peak_mb:.1f}\t{peak_mb - base_mb:.1f}\t{out_sizes[0]}")
+
+
+def main() -> None:
+    if len(sys.argv) >= 3 and sys.argv[1] == "--mode":
+        run_mode(sys.argv[2], sys.argv[3], [int(p) for p in sys.argv[4:]])
+        return
+    if len(sys.argv) == 3 and sys.argv[1] == "--make-sample":
+        with open(sys.argv[2], "wb") as f:
+            f.write(make_sample_pdf())
+        return
+
+    if len(sys.argv) >= 2:
+        pdf_path = sys.argv[1]
+        pages = [int(p) for p in sys.argv[2:]] or [0]
+    else:
+        pdf_path = os.path.join(tempfile.gettempdir(), "bench_render_sample.pdf")
+        subprocess.run([sys.executable, __file__, "--make-sample", pdf_path], check=True)
+        pages = [0, 1]
+
+    print(f"Fayl: {pdf_path}  sahifalar: {pages}")
+    print(f"{'rejim':<10}{'vaqt (s)':>10}{'peak RSS (MB)':>16}{'render +RSS':>14}  natija o'lchami")
+    for mode in ("legacy", "targeted"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, pdf_path] + [str(p) for p in pages],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        name, elapsed, peak, delta, size = out.split("\t")
+        print(f"{name:<10}{float(elapsed):>10.3f}{float(peak):>16.1f}{float(delta):>14.1f}  {size}")
+
+
+if __name__ == "__main__":
+    main()
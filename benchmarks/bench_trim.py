@@ -0,0 +1,139 @@
+# File: benchmarks/bench_trim.py
+"""Chetlarni kesish tekshiruvi: sintetik sahifa maketlarida content_bbox barcha
+matnni saqlashi, chetdagi chizg'ich/rang kartasini esa tashlab yuborishi kerak.
+
+Ishga tushirish (loyiha ildizidan):
+    python benchmarks/bench_trim.py
+
+Har bir maket uchun topilgan blok, tejalgan piksellar va vaqt chiqariladi.
+Matn kesilib qolsa yoki chizg'ich/karta blokka kirsa - chiqish kodi 1.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from image_pipeline import content_bbox  # noqa: E402
+
+PAGE_SIZE = (1800, 2400)
+PAPER = (240, 235, 220)
+INK = (30, 30, 30)
+SLACK = 80  # blok matndan shu pikseldan ko'p kengaymasligi kerak (padding bilan)
+
+
+def blank():
+    img = Image.new("RGB", PAGE_SIZE, PAPER)
+    return img, ImageDraw.Draw(img)
+
+
+def text_lines(draw, x0, x1, y0, y1, step=60, height=22):
+    for y in range(y0, y1, step):
+        draw.rectangle([x0, y, x1, y + height], fill=INK)
+
+
+def ruler(draw, side):
+    """Chetdagi oq-qora o'lchov chizg'ichi"""
+    if side == "left":
+        draw.rectangle([15, 100, 55, 2300], fill=(250, 250, 250), outline=(0, 0, 0), width=3)
+        for y in range(100, 2300, 40):
+            draw.rectangle([15, y, 55, y + 20], fill=(0, 0, 0))
+    else:
+        draw.rectangle([100, 2330, 1700, 2370], fill=(250, 250, 250), outline=(0, 0, 0), width=3)
+        for x in range(100, 1700, 40):
+            draw.rectangle([x, 2330, x + 20, 2370], fill=(0, 0, 0))
+
+
+def color_card(draw):
+    """Pastki chetdagi rang kartasi"""
+    colors = [(200, 40, 40), (40, 160, 40), (40, 40, 200), (230, 210, 40),
+              (20, 20, 20), (120, 120, 120), (250, 250, 250), (160, 90, 40)]
+    for i, color in enumerate(colors):
+        draw.rectangle([300 + i * 150, 2260, 430 + i * 150, 2370], fill=color, outline=(0, 0, 0))
+
+
+def layout_plain():
+    img, draw = blank()
+    text_lines(draw, 300, 1500, 300, 2100)
+    return img, (300, 300, 1500, 2082)
+
+
+def layout_two_columns():
+    img, draw = blank()
+    text_lines(draw, 150, 800, 200, 2200)
+    text_lines(draw, 1000, 1650, 200, 2200)
+    return img, (150, 200, 1650, 2182)
+
+
+def layout_heading_gloss():
+    img, draw = blank()
+    text_lines(draw, 600, 1200, 200, 320)  # sarlavha
+    text_lines(draw, 300, 1500, 700, 2200)
+    text_lines(draw, 1600, 1750, 900, 1500, height=18)  # hoshiya izohi
+    return img, (300, 200, 1750, 2182)
+
+
+def layout_page_number():
+    img, draw = blank()
+    text_lines(draw, 300, 1500, 300, 2100)
+    draw.rectangle([860, 2250, 940, 2275], fill=INK)
+    return img, (300, 300, 1500, 2275)
+
+
+def layout_ruler_card():
+    img, draw = blank()
+    text_lines(draw, 300, 1500, 300, 2100)
+    ruler(draw, "left")
+    color_card(draw)
+    return img, (300, 300, 1500, 2082)
+
+
+def layout_bottom_ruler():
+    img, draw = blank()
+    text_lines(draw, 300, 1500, 300, 2100)
+    ruler(draw, "bottom")
+    return img, (300, 300, 1500, 2082)
+
+
+def layout_two_columns_ruler_card():
+    img, draw = blank()
+    text_lines(draw, 150, 800, 200, 2150)
+    text_lines(draw, 1000, 1650, 200, 2150)
+    ruler(draw, "left")
+    color_card(draw)
+    return img, (150, 200, 1650, 2132)
+
+
+LAYOUTS = {
+    "oddiy": layout_plain,
+    "ikki ustun": layout_two_columns,
+    "sarlavha + hoshiya": layout_heading_gloss,
+    "sahifa raqami": layout_page_number,
+    "chizg'ich + karta": layout_ruler_card,
+    "pastki chizg'ich": layout_bottom_ruler,
+    "2 ustun + chizg'ich": layout_two_columns_ruler_card,
+}
+
+
+def main() -> int:
+    failures = 0
+    print(f"{'maket':<22}{'blok':>26}{'tejash':>9}{'vaqt (ms)':>11}  natija")
+    for name, build in LAYOUTS.items():
+        img, text = build()
+        start = time.perf_counter()
+        box = content_bbox(img)
+        elapsed = (time.perf_counter() - start) * 1000
+        keeps_text = box is not None and box[0] <= text[0] and box[1] <= text[1] and box[2] >= text[2] and box[3] >= text[3]
+        tight = box is not None and all(abs(b - t) <= SLACK for b, t in zip(box, text))
+        saved = 1 - (box[2] - box[0]) * (box[3] - box[1]) / (img.width * img.height) if box else 0.0
+        verdict = "OK" if keeps_text and tight else ("matn kesildi" if not keeps_text else "chet qoldi")
+        failures += verdict != "OK"
+        print(f"{name:<22}{str(box):>26}{saved:>9.0%}{elapsed:>11.1f}  {verdict}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,651 @@
+# File: image_pipeline.py
+"""Rasmga ishlov berish bosqichlari (Streamlit'dan mustaqil).
+
+Slayder sozlamalari (aylantirish / yorqinlik / kontrast) va AI uchun
+tayyorlash shu yerda. Jarayon bo'yi yashaydigan keshlar app.py da
+@st.cache_resource orqali bitta nusxada saqlanadi.
+"""
+
+import io
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter, ImageOps, ImageStat
+
+
+# ==========================================
+# 1. NUQTAVIY AMALLAR DVIGATELI (BITTA LUT + BITTA KONVOLYUTSIYA)
+# ==========================================
+# PIL zanjiri (Brightness -> Contrast -> Contrast -> Sharpness) har qadamda
+# butun rasmni qayta o'qib yangi rasm yaratadi. Yorqinlik va kontrast
+# piksel-nuqtaviy amallar, shuning uchun ularni 256 qiymatli bitta jadvalga
+# (LUT) yig'ib, rasmdan BIR marta o'tish yetarli. Keskinlik yagona 3x3 yadro.
+LUT_MODES = ("L", "RGB")
+# ImageFilter.SMOOTH yadrosi - ImageEnhance.Sharpness shu bilan aralashtiradi
+_SMOOTH_KERNEL = np.array([1, 1, 1, 1, 5, 1, 1, 1, 1], dtype=np.float64) / 13.0
+
+
+def _luma_histogram(img: Image.Image) -> np.ndarray:
+    """ImageEnhance.Contrast o'rtachasi uchun kulrang gistogramma (256 ta qiymat)"""
+    return np.asarray(img.convert("L").histogram(), dtype=np.float64)
+
+
+def build_point_lut(hist: np.ndarray, brightness: float = 1.0, contrasts=()) -> np.ndarray:
+    """Yorqinlik va kontrast bosqichlarini bitta uint8 jadvalga yig'ish.
+
+    Har bir kontrast bosqichi ImageEnhance.Contrast kabi OLDINGI bosqich
+    natijasining o'rtacha kulrang qiymati atrofida cho'zadi. O'rtacha
+    qiymat rasmni qayta o'qimasdan, gistogrammani jadval orqali o'tkazib
+    hisoblanadi. Har bosqichdan keyingi floor PIL'ning oraliq 8-bitli
+    natijasini takrorlaydi.
+    """
+    values = np.arange(256, dtype=np.float64)
+    total = hist.sum() or 1.0
+    if brightness != 1.0:
+        values = np.floor(np.clip(values * brightness, 0, 255))
+    for factor in contrasts:
+        if factor == 1.0:
+            continue
+        mean = int(float((hist * values).sum()) / total + 0.5)
+        values = np.floor(np.clip(mean + (values - mean) * factor, 0, 255))
+    return values.astype(np.uint8)
+
+
+def apply_lut(img: Image.Image, lut: np.ndarray) -> Image.Image:
+    """Jadvalni barcha kanallarga bir o'tishda qo'llash (Image.point C siklida)"""
+    return img.point(lut.tolist() * len(img.getbands()))
+
+
+def sharpen(img: Image.Image, factor: float) -> Image.Image:
+    """ImageEnhance.Sharpness ekvivalenti - bitta 3x3 konvolyutsiya.
+
+    Sharpness = SMOOTH + (img - SMOOTH) * factor; ikkalasi chiziqli bo'lgani
+    uchun bitta yadroga birlashadi: factor * delta + (1 - factor) * SMOOTH.
+    """
+    if factor == 1.0:
+        return img
+    if img.mode not in LUT_MODES:
+        return ImageEnhance.Sharpness(img).enhance(factor)
+    kernel = _SMOOTH_KERNEL * (1.0 - factor)
+    kernel[4] += factor
+    return img.filter(ImageFilter.Kernel((3, 3), kernel.tolist(), scale=1))
+
+
+def fused_enhance(img: Image.Image, brightness: float = 1.0, contrasts=(), sharpness: float = 1.0) -> Image.Image:
+    """Yorqinlik + kontrast bosqichlari (bitta LUT) va keskinlik (bitta yadro)"""
+    contrasts = tuple(c for c in contrasts if c != 1.0)
+    if brightness != 1.0 or contrasts:
+        if img.mode not in LUT_MODES:
+            img = img.convert("RGB")
+        lut = build_point_lut(_luma_histogram(img) if contrasts else np.ones(256), brightness, contrasts)
+        img = apply_lut(img, lut)
+    return sharpen(img, sharpness)
+
+
+# ==========================================
+# 2. SLAYDER SOZLAMALARI (ROTATE / BRIGHTNESS / CONTRAST)
+# ==========================================
+def adjust_image(img: Image.Image, rot: int, br: float, ct: float) -> Image.Image:
+    """Foydalanuvchi sozlamalarini qo'llash - o'zgarmaydigan (no-op) qadamlar o'tkazib yuboriladi"""
+    if rot:
+        img = img.rotate(rot, expand=True)
+    return fused_enhance(img, brightness=br, contrasts=(ct,))
+
+
+def legacy_adjust_chain(img: Image.Image, br: float, ct: float, ai_contrast: float, ai_sharpness: float) -> Image.Image:
+    """Oldingi PIL zanjiri - faqat benchmark va solishtirish uchun"""
+    img = ImageEnhance.Brightness(img).enhance(br)
+    img = ImageEnhance.Contrast(img).enhance(ct)
+    img = ImageEnhance.Contrast(img).enhance(ai_contrast)
+    if ai_sharpness != 1.0:
+        img = ImageEnhance.Sharpness(img).enhance(ai_sharpness)
+    return img
+
+
+# ==========================================
+# 3. LOKAL ADAPTIV BINARIZATSIYA (SAUVOLA / OTSU)
+# ==========================================
+# Qat'iy 128 chegarasi o'chgan (temir-gall) siyohni fonga qo'shib yuboradi.
+# Sauvola har piksel uchun atrofdagi oynaning o'rtacha va og'ishidan chegara
+# oladi; o'rtacha/og'ish integral rasmlar orqali O(1) da hisoblanadi.
+# Rasm gorizontal bo'laklarda (halo bilan) ishlanadi - 10k pikselli
+# o'ramlarda ham float64 massivlar faqat bitta bo'lak hajmida bo'ladi.
+BINARIZE_MODES = ("sauvola", "otsu")
+SAUVOLA_WINDOW = 31
+SAUVOLA_K = 0.2
+SAUVOLA_R = 128.0
+BINARIZE_TILE_ROWS = 512
+
+
+def otsu_threshold(hist) -> int:
+    """256 qiymatli gistogrammadan Otsu chegarasi (sinflararo dispersiya maksimumi)"""
+    hist = np.asarray(hist, dtype=np.float64)
+    total = hist.sum()
+    if total == 0:
+        return 128
+    levels = np.arange(256, dtype=np.float64)
+    weight_bg = np.cumsum(hist)
+    weight_fg = total - weight_bg
+    cum_mean = np.cumsum(hist * levels)
+    mean_bg = cum_mean / np.maximum(weight_bg, 1)
+    mean_fg = (cum_mean[-1] - cum_mean) / np.maximum(weight_fg, 1)
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between))
+
+
+def _window_sums(padded: np.ndarray, window: int) -> tuple:
+    """Integral rasmlar orqali har piksel atrofidagi oyna yig'indisi va kvadratlar yig'indisi"""
+    integral = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1), dtype=np.float64)
+    np.cumsum(np.cumsum(padded, axis=0), axis=1, out=integral[1:, 1:])
+    total = integral[window:, window:] - integral[:-window, window:] - integral[window:, :-window] + integral[:-window, :-window]
+    integral[1:, 1:] = np.cumsum(np.cumsum(padded * padded, axis=0), axis=1)
+    total_sq = integral[window:, window:] - integral[:-window, window:] - integral[window:, :-window] + integral[:-window, :-window]
+    return total, total_sq
+
+
+def sauvola_binarize(gray: Image.Image, window: int = SAUVOLA_WINDOW, k: float = SAUVOLA_K,
+                     r: float = SAUVOLA_R, tile_rows: int = BINARIZE_TILE_ROWS) -> Image.Image:
+    """T = m * (1 + k * (s / R - 1)); piksel T dan yorug' bo'lsa - fon (255)"""
+    window |= 1  # toq oyna - markaz piksel aniq
+    half = window // 2
+    src = np.asarray(gray.convert("L") if gray.mode != "L" else gray)
+    height, width = src.shape
+    out = np.empty((height, width), dtype=np.uint8)
+    area = float(window * window)
+
+    for top in range(0, height, tile_rows):
+        bottom = min(top + tile_rows, height)
+        # Halo: yuqori/pastdan qo'shni qatorlar, chetlarda akslantirish
+        lo, hi = max(top - half, 0), min(bottom + half, height)
+        strip = src[lo:hi].astype(np.float64)
+        strip = np.pad(strip, ((half - (top - lo), half - (hi - bottom)), (half, half)), mode="reflect")
+        total, total_sq = _window_sums(strip, window)
+        mean = total / area
+        std = np.sqrt(np.maximum(total_sq / area - mean * mean, 0.0))
+        threshold = mean * (1.0 + k * (std / r - 1.0))
+        out[top:bottom] = np.where(src[top:bottom] > threshold, 255, 0)
+    return Image.fromarray(out, mode="L")
+
+
+def binarize(img: Image.Image, method: str = "sauvola") -> Image.Image:
+    """Matn/fon ajratish: "sauvola" (lokal adaptiv) yoki "otsu" (global)"""
+    gray = img if img.mode == "L" else img.convert("L")
+    if method == "sauvola":
+        return sauvola_binarize(gray)
+    if method == "otsu":
+        threshold = otsu_threshold(gray.histogram())
+        return gray.point([255 if v > threshold else 0 for v in range(256)])
+    raise ValueError(f"Noma'lum binarizatsiya usuli: {method}")
+
+
+# ==========================================
+# 4. QIYSHIQLIKNI TO'G'RILASH (PROJECTION PROFILE)
+# ==========================================
+# Burchak kichraytirilgan kulrang nusxada topiladi: siyoh maskasi aylantirilib,
+# qatorlar bo'yicha yig'indining (projection profile) dispersiyasi o'lchanadi -
+# qatorlar gorizontal bo'lganda profil eng "tishli", dispersiya eng katta.
+# Avval qo'pol qadam, so'ng eng yaxshi burchak atrofida mayda qadam.
+# To'liq o'lchamdagi rasm faqat BIR marta aylantiriladi.
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_COARSE_STEP = 0.5
+DESKEW_FINE_STEP = 0.1
+DESKEW_MIN_ANGLE = 0.2  # bundan kichik qiyshiqlik uchun aylantirish arzimaydi
+DESKEW_SAMPLE_PX = 800
+
+
+def _profile_score(mask: Image.Image, angle: float) -> float:
+    rotated = np.asarray(mask.rotate(angle, resample=Image.Resampling.NEAREST, expand=False), dtype=np.float32)
+    return float(rotated.sum(axis=1).var())
+
+
+def estimate_skew(img: Image.Image, max_angle: float = DESKEW_MAX_ANGLE, coarse_step: float = DESKEW_COARSE_STEP,
+                  fine_step: float = DESKEW_FINE_STEP, sample_px: int = DESKEW_SAMPLE_PX) -> float:
+    """Qiyshiqlik burchagi (gradus, rotate() uchun tayyor) - kichik nusxada"""
+    small = img.convert("L") if img.mode != "L" else img
+    small = small.copy()
+    small.thumbnail((sample_px, sample_px), Image.Resampling.BILINEAR)
+    threshold = otsu_threshold(small.histogram())
+    mask = small.point([1 if v <= threshold else 0 for v in range(256)])  # siyoh = 1
+
+    coarse = np.arange(-max_angle, max_angle + coarse_step / 2, coarse_step)
+    best = max(coarse, key=lambda a: _profile_score(mask, a))
+    fine = np.arange(best - coarse_step, best + coarse_step + fine_step / 2, fine_step)
+    best = max(fine, key=lambda a: _profile_score(mask, a))
+    return round(float(best), 2)
+
+
+def deskew(img: Image.Image, min_angle: float = DESKEW_MIN_ANGLE) -> tuple:
+    """(to'g'rilangan rasm, burchak, sarflangan vaqt). Kichik burchakda rasm o'zgarmaydi."""
+    start = time.perf_counter()
+    angle = estimate_skew(img)
+    if abs(angle) < min_angle:
+        return img, angle, time.perf_counter() - start
+    small = img.copy()
+    small.thumbnail((64, 64))
+    fill = tuple(int(v) for v in ImageStat.Stat(small).median)  # qog'oz rangi
+    fill = fill[0] if len(fill) == 1 else fill
+    out = img.rotate(angle, resample=Image.Resampling.BICUBIC, expand=True, fillcolor=fill)
+    return out, angle, time.perf_counter() - start
+
+
+def deskew_stage(img: Image.Image):
+    """Pipeline bosqichi: (rasm, izoh) - burchak bosqich statistikasiga yoziladi"""
+    out, angle, _ = deskew(img)
+    return out, f"{angle:+.2f}°"
+
+
+# ==========================================
+# 5. CHETLARNI KESISH (MATN BLOKI BO'YICHA)
+# ==========================================
+# Keng bo'sh chetlar, o'lchov chizg'ichlari va rang kartalari payload
+# piksellarini (va Gemini tasvir tokenlarini) ko'paytiradi. Matn bloki
+# kichik nusxadagi Sauvola siyoh maskasining qator/ustun profillaridan
+# topiladi: kichik bo'shliqlar bilan birlashtirilgan BARCHA siyohli oraliqlar
+# birlashmasi olinadi (ikki ustun, sarlavha, hoshiya izohlari saqlanadi).
+# Faqat rasm chetiga tegib turgan, bo'shliq bilan ajralgan, ingichka va
+# zich oraliq (chizg'ich, rang kartasi) olib tashlanadi - ichkaridagi matn hech qachon.
+TRIM_SAMPLE_PX = 600
+TRIM_WINDOW = 15
+TRIM_MIN_INK = 0.01  # qator/ustun "faol" bo'lishi uchun siyoh ulushi
+TRIM_MAX_GAP = 0.03  # shundan kichik bo'shliqlar matn blokiga qo'shiladi (o'lchamga nisbatan)
+TRIM_PAD = 0.02  # topilgan blok atrofida qoldiriladigan chet
+TRIM_MIN_SAVING = 0.05  # 5% dan kam tejalsa kesilmaydi
+TRIM_EDGE_ZONE = 0.03  # chizg'ich/karta rasm chetidan shu ulushgacha bo'lgan joyda boshlanadi
+TRIM_EDGE_MAX = 0.08  # chizg'ich/karta qalinligi (o'lchamga nisbatan) shundan oshmaydi
+TRIM_EDGE_MIN_INK = 0.15  # chizg'ich/karta matnga nisbatan zich: o'rtacha siyoh ulushi
+
+
+def _ink_spans(profile: np.ndarray, min_ink: float, max_gap: int) -> list:
+    """Faol qiymatlarning kichik bo'shliqlar birlashtirilgan oraliqlari [(boshi, oxiri), ...]"""
+    active = np.flatnonzero(profile > min_ink)
+    if active.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(active) > max_gap + 1)
+    starts = np.concatenate(([active[0]], active[breaks + 1]))
+    ends = np.concatenate((active[breaks], [active[-1]]))
+    return [(int(a), int(b) + 1) for a, b in zip(starts, ends)]
+
+
+def _is_edge_artifact(profile: np.ndarray, span: tuple, at_start: bool) -> bool:
+    """Rasm chetidagi ingichka zich oraliq - chizg'ich yoki rang kartasi"""
+    n = profile.size
+    a, b = span
+    touches = a <= n * TRIM_EDGE_ZONE if at_start else b >= n * (1.0 - TRIM_EDGE_ZONE)
+    return touches and b - a <= n * TRIM_EDGE_MAX and profile[a:b].mean() >= TRIM_EDGE_MIN_INK
+
+
+def _content_span(profile: np.ndarray, min_ink: float, max_gap: int):
+    """Barcha siyohli oraliqlar birlashmasi (chetdagi chizg'ich/kartalarsiz) yoki None"""
+    spans = _ink_spans(profile, min_ink, max_gap)
+    while len(spans) > 1 and _is_edge_artifact(profile, spans[0], True):
+        spans.pop(0)
+    while len(spans) > 1 and _is_edge_artifact(profile, spans[-1], False):
+        spans.pop()
+    if not spans:
+        return None
+    return spans[0][0], spans[-1][1]
+
+
+def content_bbox(img: Image.Image, sample_px: int = TRIM_SAMPLE_PX):
+    """Matn blokining (chap, yuqori, o'ng, past) chegarasi - img koordinatalarida, yoki None"""
+    small = img.convert("L") if img.mode != "L" else img.copy()
+    small.thumbnail((sample_px, sample_px), Image.Resampling.BILINEAR)
+    ink = np.asarray(sauvola_binarize(small, window=TRIM_WINDOW)) == 0
+    height, width = ink.shape
+
+    # Profillar navbatma-navbat toraytiriladi: chetdagi chizg'ich barcha qatorlarni,
+    # pastdagi rang kartasi esa matn ustunlarini "faol" qilib qo'ymasligi uchun
+    rows, cols = (0, height), (0, width)
+    for _ in range(2):
+        cols = _content_span(ink[rows[0]:rows[1]].mean(axis=0), TRIM_MIN_INK, int(width * TRIM_MAX_GAP))
+        if cols is None:
+            return None
+        rows = _content_span(ink[:, cols[0]:cols[1]].mean(axis=1), TRIM_MIN_INK, int(height * TRIM_MAX_GAP))
+        if rows is None:
+            return None
+
+    pad_y, pad_x = int(height * TRIM_PAD), int(width * TRIM_PAD)
+    sx, sy = img.width / width, img.height / height
+    return (
+        max(int((cols[0] - pad_x) * sx), 0),
+        max(int((rows[0] - pad_y) * sy), 0),
+        min(int((cols[1] + pad_x) * sx + 0.5), img.width),
+        min(int((rows[1] + pad_y) * sy + 0.5), img.height),
+    )
+
+
+def trim_margins(img: Image.Image, min_saving: float = TRIM_MIN_SAVING) -> Image.Image:
+    """Rasmni matn blokiga qirqish; tejash kichik bo'lsa AYNAN shu rasm qaytadi"""
+    box = content_bbox(img)
+    if box is None:
+        return img
+    kept = (box[2] - box[0]) * (box[3] - box[1])
+    if kept >= img.width * img.height * (1.0 - min_saving):
+        return img
+    return img.crop(box)
+
+
+# ==========================================
+# 6. KATTA RASMLARNI QATORLAR ORALIG'IDAN BO'LISH
+# ==========================================
+# O'rtadan kesish qatorni ikkiga bo'ladi (overlap bilan esa qator ikki marta
+# o'qiladi). Bo'lish o'qi bo'yicha siyoh profili olinadi va har bir kesish
+# ideal nuqtaga eng yaqin qatorlararo bo'shliq markaziga qo'yiladi.
+# Bo'laklar soni modelning qulay o'lchamidan kelib chiqadi, overlap yo'q.
+SPLIT_TILE_PX = 1800  # bo'lak uzunligi (bo'lish o'qi bo'yicha) - AI uchun qulay o'lcham
+SPLIT_SEARCH_RATIO = 0.2  # ideal kesish nuqtasidan +- bo'lak uzunligining shu ulushida qidirish
+SPLIT_PROFILE_PX = 512  # profil uchun ko'ndalang o'q shu o'lchamgacha kichraytiriladi
+SPLIT_GAP_TOLERANCE = 0.005  # minimumdan shu ulush (ko'ndalang o'lcham) farqli qatorlar ham "bo'sh"
+
+
+def ink_profile(img: Image.Image, axis: int) -> np.ndarray:
+    """Siyoh profili: axis=0 - har qator, axis=1 - har ustun bo'yicha siyoh piksellar soni.
+    Bo'lish o'qi to'liq aniqlikda qoladi, faqat ko'ndalang o'q kichraytiriladi."""
+    gray = img.convert("L") if img.mode != "L" else img
+    if axis == 0:
+        size = (min(gray.width, SPLIT_PROFILE_PX), gray.height)
+    else:
+        size = (gray.width, min(gray.height, SPLIT_PROFILE_PX))
+    if size != gray.size:
+        gray = gray.resize(size, Image.Resampling.BOX)
+    arr = np.asarray(gray)
+    ink = arr <= otsu_threshold(gray.histogram())
+    profile = ink.sum(axis=1 - axis).astype(np.float64)
+    # 3 pikselli silliqlash - bitta shovqin nuqtasi bo'shliqni "yopib" qo'ymasligi uchun
+    return np.convolve(profile, np.ones(3) / 3.0, mode="same")
+
+
+def line_gap_cuts(profile: np.ndarray, parts: int, search: int, tolerance: float) -> list:
+    """[0, c1, ..., len] kesish nuqtalari - har biri ideal nuqtaga yaqin bo'shliq markazida"""
+    length = len(profile)
+    cuts = [0]
+    for k in range(1, parts):
+        ideal = round(k * length / parts)
+        lo = max(cuts[-1] + 1, ideal - search)
+        hi = min(length - 1, ideal + search)
+        if lo >= hi:
+            cuts.append(min(max(ideal, cuts[-1] + 1), length - 1))
+            continue
+        window = profile[lo:hi + 1]
+        quiet = np.flatnonzero(window <= window.min() + tolerance) + lo
+        # Ketma-ket "bo'sh" qatorlarni bo'shliqlarga guruhlab, markazi idealga eng yaqinini olamiz
+        breaks = np.flatnonzero(np.diff(quiet) > 1)
+        starts = np.concatenate(([quiet[0]], quiet[breaks + 1]))
+        ends = np.concatenate((quiet[breaks], [quiet[-1]]))
+        centers = (starts + ends) // 2
+        cuts.append(int(centers[np.argmin(np.abs(centers - ideal))]))
+    cuts.append(length)
+    return cuts
+
+
+def plan_split(img: Image.Image, tile_px: int = SPLIT_TILE_PX) -> list:
+    """Bo'laklar (chap, yuqori, o'ng, past) ro'yxati; kichik rasm uchun bitta quti"""
+    w, h = img.size
+    axis = 1 if w > h * 1.5 else 0  # eni juda katta bo'lsa ustunlar bo'yicha
+    length, cross = (w, h) if axis == 1 else (h, w)
+    parts = -(-length // tile_px)
+    if parts <= 1:
+        return [(0, 0, w, h)]
+    profile = ink_profile(img, axis)
+    tolerance = max(1.0, (min(cross, SPLIT_PROFILE_PX)) * SPLIT_GAP_TOLERANCE)
+    cuts = line_gap_cuts(profile, parts, int(length / parts * SPLIT_SEARCH_RATIO), tolerance)
+    if axis == 1:
+        return [(a, 0, b, h) for a, b in zip(cuts, cuts[1:])]
+    return [(0, a, w, b) for a, b in zip(cuts, cuts[1:])]
+
+
+def split_by_line_gaps(img: Image.Image, tile_px: int = SPLIT_TILE_PX) -> list:
+    """Rasmni overlap'siz, qatorlar oralig'idan kesilgan bo'laklarga ajratish"""
+    return [img.crop(box) for box in plan_split(img, tile_px)]
+
+
+# ==========================================
+# 7. REJALASHTIRILGAN PREPROCESSING PIPELINE
+# ==========================================
+# Bosqichlar yozilgan tartibda emas, arzonlik tartibida bajariladi:
+# avval geometriya va kichraytirish (keyingi hamma narsa kichik rasmda),
+# payload o'lchamidagi kesish (chetlar), keyin rang kamaytirish (3 kanal -> 1), so'ng nuqtaviy amallar va filtrlar.
+STAGE_ORDER = {"geometry": 0, "resize": 1, "crop": 2, "color": 3, "point": 4, "filter": 5}
+
+
+class Stage(NamedTuple):
+    """Pipeline bosqichi. fn rasmni o'zgartirmasa AYNAN shu obyektni qaytaradi (no-op).
+    fn (rasm, izoh) juftini ham qaytarishi mumkin - izoh StageTiming.detail ga yoziladi.
+    """
+    name: str
+    kind: str  # STAGE_ORDER kalitlaridan biri
+    fn: Callable
+    params: tuple = ()
+
+
+class StageTiming(NamedTuple):
+    name: str
+    seconds: float
+    nbytes: int  # bosqich ajratgan yangi rasm hajmi (no-op/qayta ishlatilganda 0)
+    status: str  # "ran" | "skipped" | "reused"
+    detail: str = ""  # bosqich izohi (masalan, topilgan qiyshiqlik burchagi)
+    px_in: int = 0
+    px_out: int = 0
+
+
+class PreprocessPipeline:
+    """Deklarativ preprocessing: bosqichlar rejalashtiriladi, no-op'lar o'tkazib
+    yuboriladi, variantlar (asosiy / qayta urinish) umumiy prefiksni bo'lishadi.
+
+    shared lug'ati bitta manba rasm uchun (bosqichlar prefiksi -> natija)
+    saqlaydi: ikkinchi variant bir xil boshlanadigan bosqichlarni qayta bajarmaydi.
+    """
+
+    def __init__(self, stages):
+        for stage in stages:
+            if stage.kind not in STAGE_ORDER:
+                raise ValueError(f"Noma'lum bosqich turi: {stage.kind}")
+        # sorted barqaror: bir turdagi bosqichlar yozilgan tartibini saqlaydi
+        self.stages = tuple(sorted(stages, key=lambda st: STAGE_ORDER[st.kind]))
+
+    def plan(self) -> list:
+        return [stage.name for stage in self.stages]
+
+    def run(self, img: Image.Image, shared: dict = None, timings: list = None) -> Image.Image:
+        prefix = ()
+        for stage in self.stages:
+            prefix += ((stage.name, stage.params),)
+            if shared is not None and prefix in shared:
+                px_in, img = img.width * img.height, shared[prefix]
+                if timings is not None:
+                    timings.append(StageTiming(stage.name, 0.0, 0, "reused", "", px_in, img.width * img.height))
+                continue
+
+            start = time.perf_counter()
+            out = stage.fn(img)
+            elapsed = time.perf_counter() - start
+            detail = ""
+            if isinstance(out, tuple):
+                out, detail = out
+            if timings is not None:
+                px = (img.width * img.height, out.width * out.height)
+                if out is img:
+                    timings.append(StageTiming(stage.name, elapsed, 0, "skipped", detail, *px))
+                else:
+                    timings.append(StageTiming(stage.name, elapsed, estimate_nbytes(out), "ran", detail, *px))
+            img = out
+            if shared is not None:
+                shared[prefix] = img
+        return img
+
+
+def exif_upright(img: Image.Image) -> Image.Image:
+    """EXIF orientatsiyasi bo'lsagina aylantirish (aks holda nusxa ham olinmaydi)"""
+    if img.getexif().get(0x0112, 1) == 1:
+        return img
+    return ImageOps.exif_transpose(img) or img
+
+
+def to_grayscale(img: Image.Image) -> Image.Image:
+    return img if img.mode == "L" else ImageOps.grayscale(img)
+
+
+class PipelineStats:
+    """Jarayon bo'yi bosqich vaqtlari va ajratilgan baytlar yig'indisi"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = OrderedDict()  # name -> [runs, skipped, reused, seconds, nbytes, oxirgi izoh]
+
+    def record(self, timings) -> None:
+        with self._lock:
+            for t in timings:
+                row = self._stages.setdefault(t.name, [0, 0, 0, 0.0, 0, ""])
+                row[{"ran": 0, "skipped": 1, "reused": 2}[t.status]] += 1
+                row[3] += t.seconds
+                row[4] += t.nbytes
+                if t.detail:
+                    row[5] = t.detail
+
+    def rows(self) -> list:
+        with self._lock:
+            return [
+                {"bosqich": name, "bajarildi": r[0], "no-op": r[1], "qayta ishlatildi": r[2],
+                 "vaqt (s)": round(r[3], 3), "ajratilgan (MB)": round(r[4] / 1048576, 1), "oxirgi izoh": r[5]}
+                for name, r in self._stages.items()
+            ]
+
+
+# ==========================================
+# 8. SOZLANGAN SAHIFALAR KESHI (XOTIRA BYUDJETI BILAN)
+# ==========================================
+# Pillow piksel xotirasi: 8 bitli bir kanalli rejimlar 1 bayt, RGB/RGBA/LA/CMYK
+# va 32 bitli I/F esa 4 bayt (RGB ham 4 baytga tekislanadi - 3 emas)
+_PIXEL_BYTES = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I;16L": 2, "I;16B": 2, "I;16N": 2}
+
+
+def estimate_nbytes(value) -> int:
+    """Kesh qiymatining taxminiy xotira hajmi"""
+    if isinstance(value, Image.Image):
+        return value.width * value.height * _PIXEL_BYTES.get(value.mode, 4)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):  # AI payload: {"mime_type": ..., "data": bytes}
+        return sum(estimate_nbytes(v) for v in value.values())
+    return 0
+
+
+class AdjustmentCache:
+    """(sahifa kaliti, rot, br, ct) -> sozlangan rasm.
+
+    Har rerun'da (har savol, har tugma bosish) barcha sahifalarga sozlamalar
+    qaytadan qo'llanmaydi: faqat parametrlari o'zgargan sahifalar hisoblanadi.
+    Bayt byudjetidan oshsa eng eski ishlatilganlar (LRU) chiqarib yuboriladi.
+    Xuddi shu sinf sahifa AI payloadlari keshi sifatida ham ishlatiladi.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()  # key -> (value, nbytes)
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Keshdagi qiymat yoki None"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def put(self, key, value) -> None:
+        nbytes = estimate_nbytes(value)
+        if nbytes > self.max_bytes:
+            return  # Byudjetdan katta - keshlanmaydi
+
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._total -= old[1]
+            self._items[key] = (value, nbytes)
+            self._total += nbytes
+            while self._total > self.max_bytes and self._items:
+                _, (_, size) = self._items.popitem(last=False)
+                self._total -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# ==========================================
+# 9. AI PAYLOAD KODEKLARI
+# ==========================================
+# PNG compress_level=3 1800 px sahifada bir necha MB beradi; kodlash CPU ni,
+# yuklash esa kechikishni egallaydi. Kodek sahifa bo'yicha tanlanadi:
+# ikki rangli (binarizatsiya qilingan) rasmlar doim lossless PNG da ancha
+# kichik, qolganlari sozlangan kodek bilan kodlanadi.
+class PayloadCodec(NamedTuple):
+    name: str
+    format: str  # PIL formati
+    mime_type: str
+    options: dict
+    lossless: bool
+
+
+PAYLOAD_CODECS = {
+    c.name: c for c in (
+        PayloadCodec("png1", "PNG", "image/png", {"compress_level": 1}, True),
+        PayloadCodec("png3", "PNG", "image/png", {"compress_level": 3}, True),
+        PayloadCodec("png6", "PNG", "image/png", {"compress_level": 6}, True),
+        PayloadCodec("webp_lossless", "WEBP", "image/webp", {"lossless": True, "quality": 30, "method": 2}, True),
+        PayloadCodec("webp92", "WEBP", "image/webp", {"quality": 92, "method": 4}, False),
+        # subsampling=0 (4:4:4) - ingichka qalam izlari xromatik siqilishda yo'qolmasligi uchun
+        PayloadCodec("jpeg92", "JPEG", "image/jpeg", {"quality": 92, "subsampling": 0}, False),
+    )
+}
+DEFAULT_PAYLOAD_CODEC = "png3"
+BILEVEL_PAYLOAD_CODEC = "png6"
+
+
+def is_bilevel(img: Image.Image) -> bool:
+    """Faqat 2 ta rangdan iborat rasm (binarizatsiya natijasi)"""
+    if img.mode == "1":
+        return True
+    return img.mode == "L" and (img.getcolors(2) is not None)
+
+
+def codec_for_image(img: Image.Image, preferred: str = DEFAULT_PAYLOAD_CODEC) -> PayloadCodec:
+    """Sahifa uchun kodek: ikki rangli rasm - PNG, qolganlari - tanlangan kodek"""
+    if is_bilevel(img):
+        return PAYLOAD_CODECS[BILEVEL_PAYLOAD_CODEC]
+    return PAYLOAD_CODECS.get(preferred, PAYLOAD_CODECS[DEFAULT_PAYLOAD_CODEC])
+
+
+def encode_payload(img: Image.Image, codec: PayloadCodec) -> bytes:
+    if img.mode not in ("1", "L", "RGB"):
+        img = img.convert("RGB")
+    if codec.format == "JPEG" and img.mode == "1":
+        img = img.convert("L")
+    buf = io.BytesIO()
+    img.save(buf, format=codec.format, **codec.options)
+    # CPython'da getvalue() BytesIO ning ichki bufferini nusxasiz qaytaradi
+    # (boshqa eksport bo'lmasa) - shu baytlar to'g'ridan-to'g'ri so'rovga ketadi
+    return buf.getvalue()
+
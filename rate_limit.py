@@ -0,0 +1,137 @@
+# File: rate_limit.py
+"""Gemini so'rovlari uchun jarayon bo'yi yagona cheklovchi (Streamlit'dan mustaqil).
+
+Bitta Streamlit jarayonidagi barcha sessiyalar va oqimlar bitta API kalitini
+ishlatadi. Cheklovchi daqiqadagi so'rovlar (RPM) va taxminiy kirish tokenlari
+(TPM) uchun ikkita token-bucket yuritadi: sig'im bo'lmasa chaqiruvchi 429
+olib yiqilish o'rniga navbatda KUTADI. app.py da @st.cache_resource orqali
+bitta nusxa yaratiladi.
+"""
+
+import io
+import math
+import threading
+import time
+from collections import deque
+
+from PIL import Image
+
+# Gemini rasm tokenlari: ikkala tomoni <= 384 px bo'lsa 258 token,
+# aks holda 768x768 plitkalarga bo'linadi va har plitka 258 token
+IMAGE_TOKENS_PER_TILE = 258
+IMAGE_SMALL_PX = 384
+IMAGE_TILE_PX = 768
+CHARS_PER_TOKEN = 4
+
+
+def estimate_image_tokens(size: tuple) -> int:
+    w, h = size
+    if w <= IMAGE_SMALL_PX and h <= IMAGE_SMALL_PX:
+        return IMAGE_TOKENS_PER_TILE
+    return math.ceil(w / IMAGE_TILE_PX) * math.ceil(h / IMAGE_TILE_PX) * IMAGE_TOKENS_PER_TILE
+
+
+def estimate_request_tokens(parts) -> int:
+    """generate_content qismlari uchun taxminiy kirish tokenlari (matn + inline rasmlar)"""
+    tokens = 0
+    for part in parts if isinstance(parts, (list, tuple)) else [parts]:
+        if isinstance(part, str):
+            tokens += len(part) // CHARS_PER_TOKEN + 1
+        elif isinstance(part, dict) and isinstance(part.get("data"), (bytes, bytearray)):
+            try:
+                # Faqat sarlavha o'qiladi - rasm dekodlanmaydi
+                tokens += estimate_image_tokens(Image.open(io.BytesIO(part["data"])).size)
+            except Exception:
+                tokens += IMAGE_TOKENS_PER_TILE * 4
+    return tokens
+
+
+class _Bucket:
+    """Daqiqalik byudjet: sig'im = capacity, to'lish tezligi = capacity / 60 sekundiga"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.stamp = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_for(self, amount: float) -> float:
+        """amount uchun necha sekund kutish kerak (0 - hozir mumkin)"""
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+
+class RateLimiter:
+    """RPM + TPM token-bucket cheklovchi; navbat FIFO tartibida.
+
+    acquire(tokens) sig'im bo'lguncha bloklaydi va haqiqiy kutish vaqtini
+    qaytaradi. Javobdan keyin settle() taxminni haqiqiy token soniga
+    tenglashtiradi (ortiqcha qaytariladi, yetishmovchilik qarz bo'lib yoziladi).
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = _Bucket(rpm)
+        self.tpm = _Bucket(tpm)
+        self._cond = threading.Condition()
+        self._queue = deque()  # kutayotganlar (FIFO): [navbatga kirgan vaqt]
+        self.requests = 0
+        self.total_wait = 0.0
+        self.last_wait = 0.0
+
+    def acquire(self, tokens: int) -> float:
+        # Bitta so'rov butun daqiqalik byudjetdan katta bo'lsa ham abadiy kutmasin
+        tokens = min(float(tokens), self.tpm.capacity)
+        start = time.monotonic()
+        ticket = [start]  # noyob obyekt; ichida navbatga kirgan vaqt
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.rpm.refill(now)
+                    self.tpm.refill(now)
+                    delay = None  # navbat boshida bo'lmasak - oldingilar o'tishini kutamiz
+                    if self._queue[0] is ticket:
+                        delay = max(self.rpm.wait_for(1.0), self.tpm.wait_for(tokens))
+                        if delay <= 0:
+                            break
+                    self._cond.wait(delay)
+                self.rpm.level -= 1.0
+                self.tpm.level -= tokens
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+            waited = time.monotonic() - start
+            self.requests += 1
+            self.total_wait += waited
+            self.last_wait = waited
+        return waited
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Taxminiy va haqiqiy kirish tokenlari farqini byudjetga qaytarish/yozish"""
+        if not actual:
+            return
+        with self._cond:
+            self.tpm.refill(time.monotonic())
+            self.tpm.level = min(self.tpm.capacity, self.tpm.level + min(estimated, self.tpm.capacity) - actual)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            self.rpm.refill(now)
+            self.tpm.refill(now)
+            return {
+                "queue_depth": len(self._queue),
+                "oldest_wait_s": round(now - self._queue[0][0], 2) if self._queue else 0.0,
+                "requests": self.requests,
+                "last_wait_s": round(self.last_wait, 2),
+                "avg_wait_s": round(self.total_wait / self.requests, 2) if self.requests else 0.0,
+                "rpm_available": int(self.rpm.level),
+                "tpm_available": int(self.tpm.level),
+            }
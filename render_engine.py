@@ -0,0 +1,824 @@
+# File: render_engine.py
+"""Sahifalarni rasterlash dvigateli (Streamlit'dan mustaqil).
+
+Bu modul app.py ichidan import qilinadi. Streamlit skripti har rerun'da
+qayta bajariladi, shuning uchun jarayon bo'yi yashashi kerak bo'lgan
+obyektlar (kesh, pool) bu yerda e'lon qilinadi va app.py da
+@st.cache_resource orqali bitta nusxada saqlanadi.
+"""
+
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import threading
+import time
+import zipfile
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import NamedTuple
+
+from PIL import Image, ImageOps
+import pypdfium2 as pdfium
+
+# ==========================================
+# 1. KONTENT-MANZILLI FAYL HASHI
+# ==========================================
+HASH_CHUNK_SIZE = 4 * 1024 * 1024  # 4 MB bo'laklarda hashlash (katta PDFlar uchun)
+
+
+def file_sha256(data) -> str:
+    """Fayl mazmunining SHA-256 hashi - faqat yuklashda BIR MARTA hisoblanadi"""
+    h = hashlib.sha256()
+    view = memoryview(data)
+    for start in range(0, len(view), HASH_CHUNK_SIZE):
+        h.update(view[start:start + HASH_CHUNK_SIZE])
+    return h.hexdigest()
+
+
+# ==========================================
+# 2. DISKDAGI RENDER KESHI (LRU + BAYT BYUDJETI)
+# ==========================================
+WEBP_MAX_DIM = 16383  # WebP formatining maksimal tomoni
+
+
+class RenderCache:
+    """Render qilingan sahifalar uchun diskdagi kesh.
+
+    - Kalit: (fayl SHA-256, sahifa indeksi, scale)
+    - Format: lossless WebP (juda katta rasmlar uchun PNG)
+    - Bayt byudjeti oshsa eng eski ishlatilganlar (LRU) o'chiriladi
+    - Sessiyalar o'rtasida umumiy, jarayon qayta ishga tushsa ham saqlanadi
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, scan: bool = True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = {}  # path -> (size, last_used)
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        if scan:
+            self._scan()
+
+    def _scan(self) -> None:
+        """Diskdagi mavjud yozuvlarni indeksga olish (restartdan keyin)"""
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith(".tmp"):
+                    # Yarim yozilgan fayllar - tozalaymiz
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                self._entries[path] = (st.st_size, st.st_mtime)
+                self._total += st.st_size
+        self._evict()
+
+    def _path(self, file_hash: str, page_idx: int, scale: float) -> str:
+        # Bitta papkada juda ko'p fayl bo'lmasligi uchun hash prefiksi bo'yicha guruhlash
+        name = f"{file_hash}_{page_idx}_{scale:.4f}"
+        return os.path.join(self.cache_dir, file_hash[:2], name)
+
+    def get(self, file_hash: str, page_idx: int, scale: float):
+        """Keshdan sahifani olish (yo'q bo'lsa None)"""
+        base = self._path(file_hash, page_idx, scale)
+        for ext in (".webp", ".png"):
+            path = base + ext
+            try:
+                img = Image.open(path)
+                img.load()
+            except FileNotFoundError:
+                continue
+            except Exception:
+                self._drop(path)
+                continue
+            now = time.time()
+            with self._lock:
+                entry = self._entries.get(path)
+                if entry is None:
+                    # Boshqa jarayon yozgan fayl - indeksga qo'shamiz
+                    size = os.path.getsize(path)
+                    self._total += size
+                else:
+                    size = entry[0]
+                self._entries[path] = (size, now)
+                self.hits += 1
+            try:
+                # mtime - LRU tartibi restartdan keyin ham saqlanishi uchun
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+            return img
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, file_hash: str, page_idx: int, scale: float, img: Image.Image) -> None:
+        """Sahifani keshga yozish (atomik: vaqtinchalik fayl + os.replace)"""
+        base = self._path(file_hash, page_idx, scale)
+        if max(img.size) <= WEBP_MAX_DIM:
+            # lossless'da quality = siqish harakati: 0 - eng tez (default 80 sahifaga ~5x sekinroq,
+            # fayl hajmi deyarli bir xil). Yozuv render yo'lida sinxron turadi.
+            path, fmt, params = base + ".webp", "WEBP", {"lossless": True, "method": 0, "quality": 0}
+        else:
+            path, fmt, params = base + ".png", "PNG", {"compress_level": 1}
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            img.save(tmp, format=fmt, **params)
+            os.replace(tmp, path)
+            size = os.path.getsize(path)
+        except Exception:
+            # Kesh ishlamasa ham render davom etadi
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            old = self._entries.get(path)
+            if old:
+                self._total -= old[0]
+            self._entries[path] = (size, time.time())
+            self._total += size
+        self._evict()
+
+    def _drop(self, path: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry:
+                self._total -= entry[0]
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        """Byudjetdan oshsa - eng eski ishlatilgan yozuvlarni o'chirish"""
+        with self._lock:
+            if self._total <= self.max_bytes:
+                return
+            victims = []
+            for path, (size, used) in sorted(self._entries.items(), key=lambda kv: kv[1][1]):
+                if self._total <= self.max_bytes:
+                    break
+                victims.append(path)
+                self._total -= size
+                del self._entries[path]
+        for path in victims:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        """Kesh holati (UI yoki log uchun)"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# ==========================================
+# 3. PDF HUJJAT HANDLE POOL
+# ==========================================
+class _PooledDocument:
+    __slots__ = ("pdf", "last_used", "page_sizes")
+
+    def __init__(self, pdf):
+        self.pdf = pdf
+        self.last_used = time.monotonic()
+        self.page_sizes = None
+
+
+class PdfDocumentPool:
+    """Ochiq PdfDocument'lar pooli - har fayl BIR MARTA parse qilinadi.
+
+    - Kalit: fayl SHA-256 hashi
+    - Bo'sh turgan hujjatlar idle_timeout'dan keyin yopiladi
+    - max_open dan oshsa eng eski ishlatilgan hujjat yopiladi
+    - pdfium thread-safe emas, shuning uchun BARCHA chaqiruvlar bitta qulf ostida
+    """
+
+    def __init__(self, max_open: int = 8, idle_timeout: float = 900.0):
+        self.max_open = max_open
+        self.idle_timeout = idle_timeout
+        self._lock = threading.RLock()
+        self._docs = {}  # file_hash -> _PooledDocument
+
+    def _get(self, file_hash: str, source) -> _PooledDocument:
+        # Qulf chaqiruvchi tomonidan olingan bo'lishi kerak
+        self._reap_idle()
+        entry = self._docs.get(file_hash)
+        if entry is None:
+            entry = _PooledDocument(pdfium.PdfDocument(source))
+            self._docs[file_hash] = entry
+            self._enforce_limit(keep=file_hash)
+        entry.last_used = time.monotonic()
+        return entry
+
+    def _reap_idle(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, e in self._docs.items() if now - e.last_used > self.idle_timeout]:
+            self._close_entry(key)
+
+    def _enforce_limit(self, keep: str) -> None:
+        while len(self._docs) > self.max_open:
+            oldest = min((k for k in self._docs if k != keep), key=lambda k: self._docs[k].last_used)
+            self._close_entry(oldest)
+
+    def _close_entry(self, file_hash: str) -> None:
+        entry = self._docs.pop(file_hash, None)
+        if entry is not None:
+            try:
+                entry.pdf.close()
+            except Exception:
+                pass
+
+    def page_count(self, file_hash: str, source) -> int:
+        """Sahifalar soni (hujjat qayta ochilmaydi)"""
+        with self._lock:
+            return len(self._get(file_hash, source).pdf)
+
+    def page_sizes(self, file_hash: str, source) -> list:
+        """Har sahifaning (kenglik, balandlik) o'lchami PDF punktlarida"""
+        with self._lock:
+            entry = self._get(file_hash, source)
+            if entry.page_sizes is None:
+                sizes = []
+                for i in range(len(entry.pdf)):
+                    page = entry.pdf[i]
+                    sizes.append(tuple(page.get_size()))
+                    page.close()
+                entry.page_sizes = sizes
+            return list(entry.page_sizes)
+
+    def render(self, file_hash: str, source, page_idx: int, scale: float) -> Image.Image:
+        """Sahifani ochiq handle orqali render qilish"""
+        with self._lock:
+            page = self._get(file_hash, source).pdf[page_idx]
+            try:
+                return page.render(scale=scale).to_pil()
+            finally:
+                page.close()
+
+    def close(self, file_hash: str) -> None:
+        """Fayl almashtirilganda handle'ni darhol bo'shatish"""
+        with self._lock:
+            self._close_entry(file_hash)
+
+    def close_all(self) -> None:
+        with self._lock:
+            for key in list(self._docs):
+                self._close_entry(key)
+
+    def open_count(self) -> int:
+        with self._lock:
+            return len(self._docs)
+
+
+# ==========================================
+# 4. SAHIFALAR OYNASI (XOTIRADA CHEKLANGAN SONDAGI RASTRLAR)
+# ==========================================
+class PageWindow:
+    """Sahifa indeksi -> rasm, lekin xotirada ko'pi bilan `capacity` ta.
+
+    400 varaqli qo'lyozmada barcha sahifalar uchun ro'yxat saqlanmaydi:
+    yangi sahifa qo'shilganda eng eski ishlatilgani chiqarib yuboriladi
+    (u kerak bo'lsa disk keshidan tez qayta olinadi).
+    Yo'q sahifa uchun window[idx] -> None (eski ro'yxat bilan bir xil ishlatish).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._items = OrderedDict()
+
+    def __getitem__(self, idx):
+        img = self._items.get(idx)
+        if img is not None:
+            self._items.move_to_end(idx)
+        return img
+
+    def __setitem__(self, idx, img) -> None:
+        self._items[idx] = img
+        self._items.move_to_end(idx)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+    def __contains__(self, idx) -> bool:
+        return idx in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def items(self):
+        return list(self._items.items())
+
+    def pop(self, idx, default=None):
+        return self._items.pop(idx, default)
+
+    def ensure_capacity(self, capacity: int) -> None:
+        """Bir vaqtda kerak bo'ladigan sahifalar oynaga sig'maganda uni kengaytirish
+        (aks holda ular har rerun'da navbatma-navbat chiqarilib qayta yuklanadi)"""
+        self.capacity = max(self.capacity, capacity)
+
+
+# ==========================================
+# 5. FAYLNI DISKKA SPOOL QILISH
+# ==========================================
+# Yuklangan fayl baytlari session_state'da saqlanmaydi: u bir marta diskka
+# yoziladi, sessiya faqat (hash, yo'l) havolasini saqlaydi. pdfium va PIL
+# faylni yo'l orqali ochadi (butun fayl RAMga o'qilmaydi, PIL siqilmagan
+# formatlarni mmap qiladi).
+# ==========================================
+def spool_upload(fileobj, spool_dir: str, ext: str) -> tuple:
+    """Yuklangan faylni bo'laklab diskka yozish va bir vaqtda SHA-256 hisoblash.
+
+    Fayl kontent-manzilli nom oladi ({hash}{ext}) - bir xil faylni yuklagan
+    sessiyalar bitta nusxadan foydalanadi. Qaytaradi: (file_hash, path).
+    """
+    os.makedirs(spool_dir, exist_ok=True)
+    h = hashlib.sha256()
+    tmp = os.path.join(spool_dir, f"upload.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        fileobj.seek(0)
+    except (AttributeError, OSError):
+        pass  # Oqim (masalan, ZIP yozuvi) allaqachon boshida
+    try:
+        with open(tmp, "wb") as f:
+            while True:
+                chunk = fileobj.read(HASH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                h.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        # Buzilgan ZIP yozuvi va h.k. - yarim yozilgan fayl qolmasin
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    file_hash = h.hexdigest()
+    path = os.path.join(spool_dir, file_hash + ext.lower())
+    if os.path.exists(path):
+        os.remove(tmp)
+        now = time.time()
+        os.utime(path, (now, now))  # LRU uchun "yaqinda ishlatilgan"
+    else:
+        os.replace(tmp, path)
+    return file_hash, path
+
+
+class SpoolRegistry:
+    """Jarayon bo'yi: qaysi sessiya qaysi spool fayllardan foydalanmoqda.
+
+    Spool fayllar kontent-manzilli va sessiyalar o'rtasida umumiy, worker
+    jarayonlar ularni yo'l orqali qayta ochadi. Shuning uchun prune_spool
+    faqat joriy sessiyani emas, BARCHA tirik sessiyalar fayllarini
+    himoyalashi kerak. Sessiya yopilganini Streamlit bildirmaydi - idle_seconds
+    davomida touch() qilinmagan sessiya himoyadan chiqadi.
+    """
+
+    def __init__(self, idle_seconds: float):
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._sessions = {}  # session_id -> (yo'llar, oxirgi faollik)
+
+    def touch(self, session_id: str, paths) -> None:
+        """Sessiya hozir ishlatayotgan fayllarni yozish (har rerun'da)"""
+        with self._lock:
+            self._sessions[session_id] = (frozenset(paths), time.monotonic())
+
+    def active_paths(self) -> set:
+        """Tirik sessiyalar ishlatayotgan barcha fayllar (eskirgan sessiyalar o'chiriladi)"""
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            for sid in [sid for sid, (_, seen) in self._sessions.items() if seen < cutoff]:
+                del self._sessions[sid]
+            return set().union(*(paths for paths, _ in self._sessions.values()))
+
+
+def prune_spool(spool_dir: str, max_bytes: int, keep=()) -> None:
+    """Spool papkasi byudjetdan oshsa - eng eski fayllarni o'chirish.
+
+    keep - himoyalangan yo'llar: barcha tirik sessiyalar fayllari
+    (SpoolRegistry.active_paths), faqat joriy sessiyaniki emas.
+    """
+    keep = set(keep)
+    total = 0
+    try:
+        files = []
+        for name in os.listdir(spool_dir):
+            path = os.path.join(spool_dir, name)
+            if name.endswith(".tmp"):
+                continue
+            st = os.stat(path)
+            total += st.st_size
+            if path not in keep:
+                files.append((st.st_mtime, st.st_size, path))
+    except OSError:
+        return
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+# ==========================================
+# 6. YUKLASH: PDF, RASM VA ZIP ARXIVLAR
+# ==========================================
+# Bir nechta fayl va ZIP arxivlar bitta umumiy sahifalar ro'yxatiga
+# aylantiriladi. ZIP ichidagi fayllar xotiraga to'liq chiqarilmaydi -
+# har biri oqim (stream) sifatida to'g'ridan-to'g'ri spool faylga yoziladi.
+PDF_EXTS = {".pdf"}
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".jp2", ".j2k", ".jpx"}
+ARCHIVE_EXTS = {".zip"}
+MAX_ARCHIVE_ENTRIES = 2000
+MAX_ARCHIVE_ENTRY_BYTES = 512 * 1024 * 1024  # ZIP bomb himoyasi: yozuvning ochilgan hajmi
+
+
+class PageRef(NamedTuple):
+    """Umumiy ro'yxatdagi bitta sahifa - qaysi fayldan va uning nechanchi sahifasi"""
+    file_hash: str
+    path: str
+    kind: str       # "pdf" yoki "image"
+    page: int       # fayl ichidagi sahifa indeksi
+    name: str       # asl fayl nomi (UI uchun)
+    size: tuple     # PDF: punktlarda, rasm: pikselda
+
+
+def _natural_key(name: str) -> list:
+    """'folio_2.jpg' < 'folio_10.jpg' tartibi uchun"""
+    return [int(t) if t.isdigit() else t.lower() for t in re.split(r"(\d+)", name)]
+
+
+def _ingest_single(fileobj, name: str, spool_dir: str, pool: PdfDocumentPool,
+                   max_pixels: int = None) -> list:
+    ext = os.path.splitext(name)[1].lower()
+    if ext not in PDF_EXTS and ext not in IMAGE_EXTS:
+        return []
+    file_hash, path = spool_upload(fileobj, spool_dir, ext)
+    if ext in PDF_EXTS:
+        sizes = pool.page_sizes(file_hash, path)
+        return [PageRef(file_hash, path, "pdf", i, name, size) for i, size in enumerate(sizes)]
+    # Ko'p kadrli TIFF: sahifalar soni konteynerdan olinadi (faqat sarlavhalar o'qiladi)
+    sizes = []
+    with Image.open(path) as im:
+        # JPEG / JPEG 2000 kichraytirib dekodlanadi, boshqa formatlar esa to'liq
+        reducible = im.format in ("JPEG", "JPEG2000")
+        for frame in range(getattr(im, "n_frames", 1)):
+            im.seek(frame)
+            if max_pixels and not reducible and im.size[0] * im.size[1] > max_pixels:
+                raise ImageTooLargeError(
+                    f"{name}: {im.size[0]}x{im.size[1]} piksel - ruxsat etilgan {max_pixels // 1_000_000} MP dan katta"
+                )
+            sizes.append(im.size)
+    return [PageRef(file_hash, path, "image", i, name, size) for i, size in enumerate(sizes)]
+
+
+def ingest_upload(fileobj, name: str, spool_dir: str, pool: PdfDocumentPool,
+                  max_pixels: int = None, max_entry_bytes: int = MAX_ARCHIVE_ENTRY_BYTES,
+                  warnings: list = None) -> list:
+    """Yuklangan faylni (PDF / rasm / ZIP) PageRef ro'yxatiga aylantirish.
+
+    ZIP ichidagi buzilgan yoki max_entry_bytes dan katta yozuv butun arxivni
+    rad etmaydi: u o'tkazib yuboriladi, sababi warnings ro'yxatiga yoziladi.
+    """
+    if max_pixels is None:
+        max_pixels = MAX_DECODE_PIXELS
+    if os.path.splitext(name)[1].lower() not in ARCHIVE_EXTS:
+        return _ingest_single(fileobj, name, spool_dir, pool, max_pixels)
+
+    pages = []
+    fileobj.seek(0)
+    with zipfile.ZipFile(fileobj) as zf:
+        entries = [info for info in zf.infolist()
+                   if not info.is_dir() and not os.path.basename(info.filename).startswith(".")]
+        entries.sort(key=lambda info: _natural_key(info.filename))
+        for info in entries[:MAX_ARCHIVE_ENTRIES]:
+            ext = os.path.splitext(info.filename)[1].lower()
+            if ext not in PDF_EXTS and ext not in IMAGE_EXTS:
+                continue
+            entry_name = os.path.basename(info.filename)
+            if max_entry_bytes and info.file_size > max_entry_bytes:
+                # Diskka yozishdan OLDIN - ochilgan hajm sarlavhadan ma'lum
+                if warnings is not None:
+                    warnings.append(f"{name}/{entry_name}: {info.file_size // (1024 * 1024)} MB - "
+                                    f"ruxsat etilgan {max_entry_bytes // (1024 * 1024)} MB dan katta")
+                continue
+            try:
+                with zf.open(info) as entry:
+                    pages.extend(_ingest_single(entry, entry_name, spool_dir, pool, max_pixels))
+            except ARCHIVE_ENTRY_ERRORS as e:
+                if warnings is not None:
+                    warnings.append(f"{name}/{entry_name}: {e}")
+    return pages
+
+
+# ==========================================
+# 7. SAHIFA RENDER
+# ==========================================
+# Oldin har sahifa scale=4.0 da render qilinib, keyin optimal_resize bilan
+# 1800 px ga kichraytirilardi (A4 uchun ~46 MB bekorga rasterlash).
+# Endi scale MediaBox o'lchamidan hisoblanadi - rastr darhol kerakli o'lchamda chiqadi.
+ANALYSIS_TARGET_PX = 1800  # enhance_image_for_ai dagi optimal_resize maqsadi
+PREVIEW_TARGET_PX = 640    # Tanlash paneli va navigatsiya uchun kichik preview
+PREVIEW_FORMAT = "JPEG"
+PREVIEW_QUALITY = 80
+MAX_RENDER_SCALE = 4.0     # Eski qat'iy scale - undan oshmaymiz
+MIN_RENDER_SCALE = 0.25
+
+
+def target_render_scale(page_size: tuple, target_px: int,
+                        max_scale: float = MAX_RENDER_SCALE, min_scale: float = MIN_RENDER_SCALE) -> float:
+    """Sahifa o'lchamidan (PDF punktlarida) maqsadli piksel o'lchami uchun scale hisoblash.
+
+    Oddiy varaqlarda uzun tomon target_px ga teng bo'ladi. Juda cho'ziq
+    varaqlarda (o'ramlar) qisqa tomonning 1.5 baravari asos qilinadi -
+    aks holda matn bo'laklarga bo'linishdan oldin o'qib bo'lmas darajada kichrayadi.
+    """
+    w, h = page_size
+    long_side, short_side = max(w, h), min(w, h)
+    basis = min(long_side, short_side * 1.5)
+    if basis <= 0:
+        return max_scale
+    scale = target_px / basis
+    # Kesh kalitlari barqaror bo'lishi uchun yaxlitlaymiz
+    return round(max(min_scale, min(max_scale, scale)), 4)
+
+
+JP2_MAX_REDUCE = 5  # JPEG 2000 da ko'pi bilan 1/32 o'lchamgacha
+MAX_DECODE_PIXELS = 64_000_000  # Dekodlanadigan rastr chegarasi (decompression bomb himoyasi)
+NORMALIZED_IMAGE_PX = 2200      # Katta fotolar shu o'lchamdagi hosila nusxaga keltiriladi
+
+# PIL ning o'z chegarasi (89 MP dan keyin ogohlantirish, 179 MP da xato) sarlavhadagi
+# o'lchamga qaraydi - 200 MP foto draft bilan 1/4 da dekodlansa ham rad etiladi.
+# Shuning uchun chegarani dekodlanadigan (draft/reduce dan keyingi) o'lchamga o'zimiz qo'yamiz.
+Image.MAX_IMAGE_PIXELS = None
+
+
+class ImageTooLargeError(ValueError):
+    """Rasm piksel byudjetidan katta va kichraytirib dekodlab bo'lmaydi"""
+
+
+# Sahifani o'qishda kutiladigan xatolar (buzilgan/noma'lum fayl, juda katta rasm,
+# buzilgan PDF sahifasi). Boshqa xatolar (masalan, dasturdagi NameError) yashirilmaydi.
+PAGE_LOAD_ERRORS = (OSError, ValueError, Image.DecompressionBombError, pdfium.PdfiumError)
+# ZIP yozuvini o'qishda qo'shimcha: CRC xatosi, buzilgan deflate oqimi
+ARCHIVE_ENTRY_ERRORS = PAGE_LOAD_ERRORS + (zipfile.BadZipFile, zlib.error)
+
+
+def _box(target) -> tuple:
+    return target if isinstance(target, tuple) else (target, target)
+
+
+def open_image_frame(source, frame: int = 0, target_px=None,
+                     max_pixels: int = MAX_DECODE_PIXELS) -> Image.Image:
+    """Rasm faylidan bitta kadrni talab bo'yicha dekodlash.
+
+    - Ko'p kadrli TIFF: kerakli kadrga seek() qilinadi, boshqalari dekodlanmaydi
+    - target_px (son yoki (w, h)) berilsa: JPEG 2000 reduce, JPEG draft orqali
+      kichraytirilgan darajada dekodlanadi - to'liq o'lcham xotiraga chiqmaydi
+    - Dekodlanadigan o'lcham max_pixels dan oshsa ImageTooLargeError
+    """
+    img = Image.open(source)
+    if frame:
+        img.seek(frame)
+    decoded = img.size
+    if target_px:
+        tw, th = _box(target_px)
+        w, h = img.size
+        if img.format == "JPEG2000":
+            factor = 0
+            while (factor < JP2_MAX_REDUCE and w >> (factor + 1) >= tw and h >> (factor + 1) >= th):
+                factor += 1
+            img.reduce = factor
+            decoded = ((w + (1 << factor >> 1)) >> factor, (h + (1 << factor >> 1)) >> factor)
+        elif img.format == "JPEG":
+            img.draft(img.mode, (tw, th))
+            decoded = img.size
+    if max_pixels and decoded[0] * decoded[1] > max_pixels:
+        img.close()
+        raise ImageTooLargeError(
+            f"{decoded[0]}x{decoded[1]} piksel - ruxsat etilgan {max_pixels // 1_000_000} MP dan katta"
+        )
+    img.load()
+    if getattr(img, "n_frames", 1) > 1:
+        # Ko'p kadrli fayl seek uchun ochiq qoladi - kadrni ajratib, faylni yopamiz
+        single = img.copy()
+        img.close()
+        return single
+    return img
+
+
+def load_normalized_image(source, file_hash: str, frame: int, cache: RenderCache,
+                          target_px: int = NORMALIZED_IMAGE_PX,
+                          max_pixels: int = MAX_DECODE_PIXELS) -> Image.Image:
+    """Katta fotoni (48-200 MP) tahlil o'lchamiga yaqin darajada dekodlash.
+
+    Birinchi marta: JPEG draft bilan kichraytirib dekodlanadi, EXIF bo'yicha
+    buriladi, aniq o'lchamga keltiriladi va disk keshiga hosila sifatida yoziladi.
+    Keyingi safar: faqat hosila o'qiladi - to'liq o'lchamdagi dekod qaytib bo'lmaydi.
+    """
+    with Image.open(source) as im:
+        if frame:
+            im.seek(frame)
+        size = im.size
+    scale = target_render_scale(size, target_px, max_scale=1.0, min_scale=0.0)
+    if scale >= 1.0:
+        # Kichik rasm - hosila kerak emas
+        return open_image_frame(source, frame, max_pixels=max_pixels)
+
+    cached = cache.get(file_hash, frame, scale)
+    if cached is not None:
+        return cached
+
+    new_size = (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+    img = open_image_frame(source, frame, target_px=new_size, max_pixels=max_pixels)
+    img = ImageOps.exif_transpose(img) or img
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    # EXIF burilishidan keyin yo'nalish o'zgargan bo'lishi mumkin
+    if (img.width > img.height) != (new_size[0] > new_size[1]):
+        new_size = (new_size[1], new_size[0])
+    if img.size != new_size:
+        img = img.resize(new_size, Image.Resampling.LANCZOS)
+    cache.put(file_hash, frame, scale, img)
+    return img
+
+
+def make_preview(img: Image.Image, target_px: int = PREVIEW_TARGET_PX) -> Image.Image:
+    """Rasm (PDF bo'lmagan fayllar) uchun kichik preview nusxa"""
+    preview = img.copy()
+    preview.thumbnail((target_px, target_px), Image.Resampling.LANCZOS)
+    return preview
+
+
+def encode_preview(img: Image.Image, fmt: str = PREVIEW_FORMAT, quality: int = PREVIEW_QUALITY) -> bytes:
+    """Previewni brauzerga yuborish uchun siqilgan baytlarga aylantirish.
+
+    st.image(PIL) katta rasmlarni PNG qilib yuboradi - preview uchun
+    JPEG/WebP bir necha barobar kichik.
+    """
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, quality=quality)
+    return buf.getvalue()
+
+
+# ==========================================
+# 8. PARALLEL RASTERLASH (PROCESS POOL)
+# ==========================================
+# Har bir worker jarayon O'ZINING pdfium nusxasiga ega (thread-safe muammosi yo'q).
+# Worker tayyor sahifani to'g'ridan-to'g'ri disk keshiga yozadi va faqat
+# sahifa raqamini qaytaradi - katta rasmlar jarayonlar o'rtasida pickle qilinmaydi.
+WORKER_MAX_DOCS = 4
+
+_worker_cache = None
+_worker_docs = {}  # pdf_path -> PdfDocument (worker ichida)
+
+
+def _worker_init(cache_dir: str) -> None:
+    global _worker_cache
+    # Eviction faqat asosiy jarayonda - worker faqat yozadi
+    _worker_cache = RenderCache(cache_dir, max_bytes=1 << 62, scan=False)
+
+
+def _worker_doc(pdf_path: str):
+    pdf = _worker_docs.pop(pdf_path, None)
+    if pdf is None:
+        pdf = pdfium.PdfDocument(pdf_path)
+        while len(_worker_docs) >= WORKER_MAX_DOCS:
+            # Eng eski ishlatilgan (lug'at boshidagi) hujjat yopiladi
+            old = _worker_docs.pop(next(iter(_worker_docs)))
+            old.close()
+    _worker_docs[pdf_path] = pdf  # oxiriga qo'yish - LRU tartibi
+    return pdf
+
+
+def _worker_render(pdf_path: str, file_hash: str, page_idx: int, scale: float) -> int:
+    page = _worker_doc(pdf_path)[page_idx]
+    try:
+        img = page.render(scale=scale).to_pil()
+    finally:
+        page.close()
+    _worker_cache.put(file_hash, page_idx, scale, img)
+    return page_idx
+
+
+class ParallelRasterizer:
+    """Tanlangan sahifalarni bir nechta CPU yadrosida parallel render qilish.
+
+    render_many() generator: sahifalar TAYYOR BO'LISHI BILAN (tartibsiz)
+    (page_idx, rasm) ko'rinishida qaytariladi, shuning uchun UI har bir
+    sahifani darhol ko'rsata oladi.
+    """
+
+    def __init__(self, cache: RenderCache, max_workers: int = None):
+        self.cache = cache
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: Streamlit thread'lari bor jarayonni fork qilish xavfli
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_worker_init,
+                    initargs=(self.cache.cache_dir,),
+                )
+            return self._executor
+
+    def render_many(self, pdf_path: str, file_hash: str, pages: list, scale, fallback=None):
+        """Sahifalarni parallel render qilish - tayyor bo'lganini darhol qaytaradi.
+
+        scale - barcha sahifalar uchun bitta son yoki {page_idx: scale} lug'ati.
+        fallback(page_idx) - pool ishlamasa (masalan, worker o'lib qolsa)
+        sahifani joriy jarayonda render qiluvchi funksiya.
+        """
+        scales = scale if isinstance(scale, dict) else {p: scale for p in pages}
+        pending = []
+        for page_idx in pages:
+            img = self.cache.get(file_hash, page_idx, scales[page_idx])
+            if img is not None:
+                yield page_idx, img
+            else:
+                pending.append(page_idx)
+        if not pending:
+            return
+
+        failed = []
+        yielded = set()  # pool ishdan chiqsa: faqat haqiqatan qaytarilmagan sahifalar fallback'ga
+        if len(pending) == 1 and fallback is not None:
+            # Bitta sahifa uchun jarayonlararo overhead'ga arzimaydi
+            failed = pending
+        else:
+            try:
+                executor = self._get_executor()
+                futures = {
+                    executor.submit(_worker_render, pdf_path, file_hash, page_idx, scales[page_idx]): page_idx
+                    for page_idx in pending
+                }
+                for fut in as_completed(futures):
+                    page_idx = futures[fut]
+                    img = None
+                    try:
+                        fut.result()
+                        img = self.cache.get(file_hash, page_idx, scales[page_idx])
+                    except Exception:
+                        pass
+                    if img is not None:
+                        yielded.add(page_idx)
+                        yield page_idx, img
+                    else:
+                        failed.append(page_idx)
+            except Exception:
+                # Pool buzilgan - keyingi safar yangisini yaratamiz. Worker keshga yozib
+                # ulgurgan, lekin hali qaytarilmagan sahifalar keshdan olinadi
+                self.shutdown()
+                failed = []
+                for page_idx in pending:
+                    if page_idx in yielded:
+                        continue
+                    img = self.cache.get(file_hash, page_idx, scales[page_idx])
+                    if img is not None:
+                        yield page_idx, img
+                    else:
+                        failed.append(page_idx)
+
+        for page_idx in failed:
+            img = fallback(page_idx) if fallback is not None else None
+            if img is not None:
+                yield page_idx, img
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
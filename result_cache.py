@@ -0,0 +1,138 @@
+# File: result_cache.py
+"""Gemini tahlil natijalari uchun diskdagi kontent-manzilli kesh (Streamlit'dan mustaqil).
+
+Kalit = SHA-256(payload baytlari + mime, to'liq prompt, model nomi,
+generation_config, system_instruction). Bir xil skan qayta yuklansa - rerun,
+boshqa sessiya yoki boshqa foydalanuvchi bo'lsa ham - javob matni va
+assess_quality bahosi SQLite'dan olinadi: API chaqiruvi ham, kredit ham yo'q.
+Bayt byudjeti oshsa eng eski ishlatilgan yozuvlar (LRU) o'chiriladi.
+app.py da @st.cache_resource orqali bitta nusxa yaratiladi.
+"""
+
+import dataclasses
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA_VERSION = 1
+
+
+def config_fingerprint(config) -> str:
+    """generation_config (dict, dataclass, proto yoki None) ning barqaror JSON ko'rinishi"""
+    if config is None:
+        data = None
+    elif isinstance(config, dict):
+        data = config
+    elif dataclasses.is_dataclass(config):
+        data = dataclasses.asdict(config)
+    elif hasattr(config, "to_dict"):
+        data = config.to_dict()
+    else:
+        data = repr(config)
+    return json.dumps(data, sort_keys=True, default=str)
+
+
+def result_key(payload: dict, prompt: str, model_name: str, config=None, system_instruction: str = "") -> str:
+    """Natija kaliti: payload baytlari, prompt va model sozlamalarining SHA-256 hashi"""
+    h = hashlib.sha256()
+    for field in (
+        f"v{SCHEMA_VERSION}", model_name, config_fingerprint(config), system_instruction or "",
+        prompt, payload.get("mime_type", ""),
+    ):
+        data = field.encode("utf-8")
+        # Uzunlik prefiksi - maydonlar chegarasi aralashib ketmasligi uchun
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    h.update(bytes(payload["data"]))
+    return h.hexdigest()
+
+
+class ResultCache:
+    """SQLite'dagi natijalar keshi: key -> (javob matni, sifat bahosi).
+
+    - Bitta ulanish + lock: ishchi oqimlar va sessiyalar o'rtasida xavfsiz
+    - Jarayon qayta ishga tushsa ham saqlanadi
+    - hits/misses - joriy jarayon uchun hisoblagichlar
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, text TEXT NOT NULL, quality TEXT NOT NULL,"
+                " size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+    def get(self, key: str):
+        """(text, quality) yoki None"""
+        with self._lock:
+            try:
+                row = self._conn.execute("SELECT text, quality FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    with self._conn:
+                        self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            except sqlite3.Error:
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0], json.loads(row[1])
+
+    def put(self, key: str, model_name: str, text: str, quality: dict) -> None:
+        quality_json = json.dumps(quality, ensure_ascii=False, default=str)
+        size = len(text.encode("utf-8")) + len(quality_json.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO results (key, model, text, quality, size, created, last_used)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (key, model_name, text, quality_json, size, now, now),
+                    )
+                    self._evict()
+            except sqlite3.Error:
+                pass  # Kesh yozilmasa ham tahlil natijasi yo'qolmaydi
+
+    def _evict(self) -> None:
+        """Byudjetdan oshgan qismni eng eski ishlatilganlardan boshlab o'chirish (lock ostida)"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        stale, freed = [], 0
+        for key, size in self._conn.execute("SELECT key, size FROM results ORDER BY last_used"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM results WHERE key = ?", stale)
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM results")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "size_mb": round(total / (1024 * 1024), 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }